@@ -1,9 +1,37 @@
 from socket import socket, AF_INET, SOCK_STREAM, gethostbyname, gaierror
-from ssl import SSLWantReadError, create_default_context, SSLEOFError, SSLSocket
-from httpUtils import URL, Connection, CookieJar, getUrlName, Request, getLinksFromHTML, parseResponse, isFileUrl
-from typing import Union
+from ssl import SSLWantReadError, create_default_context, SSLEOFError, SSLSocket, SSLError, SSLContext
+from httpUtils import URL, Connection, CookieJar, getUrlName, Request, getLinksFromHTML, parseResponse, isFileUrl, \
+    HostLatencyTracker, getBackoffDelay, Response, getResponseBodyLength, isHtmlContentType, ContentTypeMemo, \
+    ChunkedDecoder, parseContentRange, getRangeValidator, positionedWrite
+from httpParsePool import ParsePool
+from httpHistory import ConnectionHistory
+from httpRobots import RobotsRules, parseRobots, iterSitemap
+from httpLinkGraph import LinkGraph
+from httpDedup import DuplicateFilter, getPageFingerprint
+from httpReplay import CaptureArchive
+from httpScheduler import HostScheduler, throttleStatusCodes, getRetryAfter
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from queue import Queue
+from threading import Lock
+from math import inf
+from heapq import nlargest
+from tempfile import TemporaryDirectory
+from typing import Union, Callable
+from collections import deque
 import os
-from time import sleep
+from time import sleep, monotonic
+
+# Errors after which the same request may succeed on a new connection.
+# ValueError is raised by parseResponse for truncated or garbled responses, bodies that fail to decompress included.
+retryableErrors: tuple = (ValueError, TimeoutError, ConnectionError, SSLError)
+# The errors of a page that mapDomain skips instead of ending the crawl. LookupError is raised by a replayed crawl that
+#   reaches a page that wasn't recorded.
+crawlErrors: tuple = retryableErrors + (LookupError,)
+# Read size used when recvSize is 0. Plain sockets require one, and TLS sockets return at most a 16KB record anyway.
+defaultRecvSize: int = 65536
+# The ALPN protocols of a context are copied to a socket when it's wrapped, so setting them and wrapping is done
+#   under this lock when conversations of several threads share a context.
+sslContextLock: Lock = Lock()
 
 
 class bColors:
@@ -22,33 +50,174 @@ class HttpConversation:
 
     def __init__(self, port: int = 443, packetRecvTimeOut: int = 2, log: bool = True, sendOptionalHeaders: bool = False,
                  acceptEncoding: str = "utf-8", recvSize: int = 0, logLocation: str = "HTTP-Logs",
-                 maxReferrals: int = 10, maxRetries: int = 5, isSecure: bool = True) -> None:
+                 maxReferrals: int = 10, maxRetries: int = 5, isSecure: bool = True, requestTimeOut: float = 30,
+                 retryBackoff: float = 0.5, maxBackoff: float = 10, adaptiveTimeOut: bool = True,
+                 parsePool: ParsePool = None, nonHtmlPolicy: str = "drain", maxDrainSize: int = 65536,
+                 historyPolicy: str = "all", historySize: int = 100, spillPath: str = None, useHttp2: bool = False,
+                 sslContext: SSLContext = None, captureArchive: CaptureArchive = None) -> None:
         self.__clientSocket: socket = None
         self.currConnection: Connection = None
         self.port: int = port
-        self.connectionList: list[Connection] = []
+        # See ConnectionHistory for the policies. A redirect chain has to fit in the kept connections, since mapDomain
+        #   reads the bodies of all of its connections.
+        self.connectionList: ConnectionHistory = ConnectionHistory(historyPolicy, max(historySize, maxReferrals + 1),
+                                                                   spillPath)
         self.packetRecvTimeOut: int = packetRecvTimeOut
         self.keepAlive: bool = False
         self.sendOptionalHeaders: bool = sendOptionalHeaders
         self.cookieJar: CookieJar = CookieJar()
         self.acceptEnc: str = acceptEncoding
         self.log: bool = log
-        self.connectionList: list[Connection] = []
         self.receiveSize: int = recvSize
+        # Every received byte, for the allData.txt log. Only kept when the whole history is kept as well.
         self.totalData: bytes = b""
         self.logLocation: str = logLocation
         self.maxReferrals: int = maxReferrals
         self.currIndex: int = -1
         self.maxRetries: int = maxRetries
         self.isSecure: bool = isSecure
+        # Total time budget of a single converse call: connecting, TLS handshake, sending, receiving and retrying.
+        self.requestTimeOut: float = requestTimeOut
+        self.retryBackoff: float = retryBackoff
+        self.maxBackoff: float = maxBackoff
+        self.adaptiveTimeOut: bool = adaptiveTimeOut
+        self.latencyTracker: HostLatencyTracker = HostLatencyTracker()
+        self.__deadline: float = 0  # For receiving the response headers, see getTimeOut.
+        self.__requestDeadline: float = 0  # For the whole request, retries included.
+        self.__headTime: float = 0  # When the headers of the latest response were received.
+        self.__socketHost: str = ""
+        # When set, response bodies are parsed by the pool and only the headers are parsed here.
+        self.parsePool: ParsePool = parsePool
+        # What to do with the body of a non-HTML response to an htmlOnly connection: "drain" reads and throws away
+        #   bodies of up to maxDrainSize bytes so the connection can be reused, "abort" always closes the connection.
+        # Bodies of unknown length or longer than maxDrainSize are aborted either way.
+        self.nonHtmlPolicy: str = nonHtmlPolicy
+        self.maxDrainSize: int = maxDrainSize
+        self.__isBodySkipped: bool = False
+        self.contentTypeMemo: ContentTypeMemo = ContentTypeMemo()
+        self.duplicateFilter: DuplicateFilter = DuplicateFilter()
+        # With useHttp2 (and the h2 package installed) TLS connections offer HTTP/2 over ALPN, and converse speaks it
+        #   when the server picks it. Downloads always use HTTP/1.1, since they stream the body from the socket.
+        # httpH2 is only imported by conversations that use HTTP/2, since importing h2 is slow.
+        if useHttp2:
+            from httpH2 import isH2Available
+            useHttp2 = isH2Available
+        self.useHttp2: bool = useHttp2
+        self.sslContext: SSLContext = create_default_context() if sslContext is None else sslContext
+        self.__h2 = None  # The H2Transport of the socket, if it negotiated HTTP/2.
+        # A recording archive gets every response, a replaying one answers the requests instead of the network (it
+        #   raises LookupError for requests it has no response to).
+        self.captureArchive: CaptureArchive = captureArchive
+        self.__capturedPackets: list[bytes] = []
+        self.__captureStartTime: float = 0
 
-    def converse(self, connection: Union[Connection, str, URL]) -> None:
-        self.currIndex += 1
+    @staticmethod
+    def __toConnection(connection: Union[Connection, str, URL]) -> Connection:
         if isinstance(connection, str):
             connection: URL = URL(connection)
             connection: Connection = Connection(connection, 'GET', getUrlName(connection))
         if isinstance(connection, URL):
             connection: Connection = Connection(connection, 'GET', getUrlName(connection))
+        return connection
+
+    def converse(self, connection: Union[Connection, str, URL]) -> None:
+        connection = self.__toConnection(connection)
+        self.__startConnection(connection)
+        maxRetries: int = self.maxRetries if connection.maxRetries is None else connection.maxRetries
+        retryCounter: int = 0
+        while True:
+            attemptStart: float = monotonic()
+            if retryCounter > 0:
+                self.__deadline = min(attemptStart + self.getTimeOut(connection), self.__requestDeadline)
+            try:
+                data = self.__sendRecv()
+                self.currConnection.response = parseResponse(
+                    data, self.currConnection.url, parseBody=self.parsePool is None and not self.__isBodySkipped)
+                self.currConnection.response.isBodySkipped = self.__isBodySkipped
+                break
+            except retryableErrors as e:
+                # The socket is in an unknown state after a failed attempt, so the next one starts from scratch.
+                self.keepAlive = False
+                retryCounter += 1
+                if retryCounter >= maxRetries or not connection.isIdempotent():
+                    raise ConnectionError(f"Could not connect to {connection.url}") from e
+                backoffDelay: float = getBackoffDelay(retryCounter, self.retryBackoff, self.maxBackoff)
+                if monotonic() + backoffDelay >= self.__requestDeadline:
+                    raise TimeoutError(f"Request deadline exceeded for {connection.url}") from e
+                print(f"{bColors.WARNING}{type(e).__name__}: {e}, retrying in {backoffDelay:.2f}s.{bColors.ENDC}")
+                sleep(backoffDelay)
+        # Only the time to the headers is tracked, the time of the body depends on its size rather than on the host.
+        self.latencyTracker.record(connection.url.domain, self.__headTime - attemptStart)
+        self.__finishConnection(connection, data, self.currIndex)
+
+    # Sends the connections at once, as concurrent streams of a single HTTP/2 connection, if the host negotiated
+    #   HTTP/2 and they are all to it, and one after the other with converse otherwise.
+    # The first connection is always sent alone, it's the one that connects and finds out whether HTTP/2 is spoken.
+    # Streams that fail are sent again with converse, which retries them. Redirects are followed one at a time.
+    def converseMany(self, connections: list[Union[Connection, str, URL]]) -> None:
+        connections = [self.__toConnection(connection) for connection in connections]
+        if not connections:
+            return
+        self.converse(connections[0])
+        connections = connections[1:]
+        if self.__h2 is None or self.__h2.isClosed or not self.keepAlive or \
+                any(connection.url.domain != self.__socketHost for connection in connections):
+            for connection in connections:
+                self.converse(connection)
+            return
+        indexes: list[int] = []
+        for connection in connections:
+            self.__startConnection(connection)
+            indexes.append(self.currIndex)
+        deadline: float = monotonic() + max(self.__getRequestTimeOut(connection) for connection in connections)
+        startTime: float = monotonic()
+        try:
+            results: list = self.__h2.exchange([(connection.request, connection.htmlOnly)
+                                                for connection in connections], deadline)
+        except retryableErrors as e:
+            self.keepAlive = False
+            results: list = [e] * len(connections)
+        for connection, index, result in zip(connections, indexes, results):
+            if not isinstance(result, Exception):
+                data, isBodySkipped = result
+                if self.__isRecording():
+                    self.captureArchive.record(connection.request, data, isBodySkipped, monotonic() - startTime)
+                self.__recordData(data, index, connection.name)
+                try:
+                    connection.response = parseResponse(data, connection.url,
+                                                        parseBody=self.parsePool is None and not isBodySkipped)
+                    connection.response.isBodySkipped = isBodySkipped
+                except ValueError as e:
+                    result = e
+            if isinstance(result, Exception):
+                print(f"{bColors.WARNING}{type(result).__name__}: {result}, sending {connection.url} "
+                      f"again.{bColors.ENDC}")
+                self.converse(connection)
+                continue
+            self.currConnection = connection
+            self.__finishConnection(connection, data, index)
+
+    # Hands the body to the parse pool, applies the response head and follows the redirect if there is one.
+    def __finishConnection(self, connection: Connection, data: bytes, index: int) -> None:
+        if self.parsePool is not None and not connection.response.isBodySkipped:
+            connection.parsed = self.parsePool.submit(data, connection.url)
+        # Without a body the parsed response would only overwrite the raw response logged by __recordData.
+        elif self.log:
+            self.__logData(connection.response, f"{index}{connection.name}_response.txt")
+        self.__processResponseHead()
+        if "location" in self.currConnection.response.headers and connection.followRedirects:
+            if self.maxReferrals > 0:
+                self.maxReferrals -= 1
+                redirectUrl: URL = URL(self.currConnection.response.headers["location"])
+                redirectType: str = "HEAD" if connection.requestType.upper() == "HEAD" else "GET"
+                self.converse(Connection(redirectUrl, redirectType, getUrlName(redirectUrl),
+                                         htmlOnly=connection.htmlOnly))
+                self.maxReferrals += 1
+            else:
+                raise ValueError("Too many redirects.")
+
+    def __startConnection(self, connection: Connection) -> None:
+        self.currIndex += 1
         self.currConnection = connection
         self.currConnection.request = Request(connection.requestType, connection.url, connection.isUserAction,
                                               connection.content, self.cookieJar.getCookiesStr(self.currConnection.url),
@@ -57,57 +226,82 @@ class HttpConversation:
             self.__logData(self.currConnection.request, f"{self.currIndex}{self.currConnection.name}_request.txt")
         self.connectionList.append(connection)
         print(f"Connecting to {connection.url}")
-        retryCounter: int = 0
-        while retryCounter < self.maxRetries:
-            try:
-                data = self.__sendRecv()
-                self.currConnection.response = parseResponse(data, self.currConnection.url)
-                break
-            except ValueError:
-                retryCounter += 1
-                if retryCounter == self.maxRetries:
-                    raise ConnectionError(f"Could not connect to {connection.url}")
-        if self.log:
-            self.__logData(self.currConnection.response, f"{self.currIndex}{self.currConnection.name}_response.txt")
+        startTime: float = monotonic()
+        self.__requestDeadline = startTime + self.__getRequestTimeOut(connection)
+        self.__deadline = min(startTime + self.getTimeOut(connection), self.__requestDeadline)
+
+    # keepAlive is only set when a socket is connected, so a socket the server closed isn't reused because of the
+    #   headers of the response it closed after.
+    def __processResponseHead(self) -> None:
         self.__printStatusLine()
         if "connection" in self.currConnection.response.headers and \
                 self.currConnection.response.headers['connection'].lower() == 'close':
             self.keepAlive = False
-        else:
-            self.keepAlive = True
         for cookie in self.currConnection.response.cookies:
             self.cookieJar.addRemoveCookie(cookie)
-        if "location" in self.currConnection.response.headers:
-            if self.maxReferrals > 0:
-                self.maxReferrals -= 1
-                self.converse(self.currConnection.response.headers["location"])
-                self.maxReferrals += 1
-            else:
-                raise ValueError("Too many redirects.")
 
-    def __changeHostIfNeeded(self) -> None:
+    # Returns the time budget for receiving the response headers of the given connection: its own timeOut if set,
+    #   otherwise the conversation's requestTimeOut, tightened according to the times to headers observed for the host
+    #   if adaptiveTimeOut is on.
+    # The tightened budget is never below packetRecvTimeOut, which a single read may take. The body isn't covered by
+    #   it: its reads may each take packetRecvTimeOut, as long as the whole request fits in its timeOut or
+    #   requestTimeOut.
+    def getTimeOut(self, connection: Connection) -> float:
+        if connection.timeOut is not None:
+            return connection.timeOut
+        if self.adaptiveTimeOut:
+            return max(self.packetRecvTimeOut,
+                       self.latencyTracker.getTimeOut(connection.url.domain, self.requestTimeOut))
+        return self.requestTimeOut
+
+    def __getRequestTimeOut(self, connection: Connection) -> float:
+        return self.requestTimeOut if connection.timeOut is None else connection.timeOut
+
+    def __getRemainingTime(self, deadline: float = None) -> float:
+        remainingTime: float = (self.__deadline if deadline is None else deadline) - monotonic()
+        if remainingTime <= 0:
+            raise TimeoutError(f"Request deadline exceeded for {self.currConnection.url}")
+        return remainingTime
+
+    # Downloads pass isHttp2Allowed=False, which replaces an HTTP/2 connection with an HTTP/1.1 one.
+    def __changeHostIfNeeded(self, isHttp2Allowed: bool = True) -> None:
         urlHost: str = self.currConnection.url.domain
-        lastConnection = self.getLastConnectionUrl()
-        if lastConnection is not None:
-            lastHost: str = self.getLastConnectionUrl().domain
-        else:
-            lastHost: str = ""
-        if self.__clientSocket is None or urlHost != lastHost or not self.keepAlive:
-            if self.__clientSocket is not None and not self.keepAlive:
+        # The current connection is already in connectionList, so the host of the open socket is kept separately.
+        if self.__clientSocket is None or urlHost != self.__socketHost or not self.keepAlive or \
+                (self.__h2 is not None and (self.__h2.isClosed or not isHttp2Allowed)):
+            if self.__h2 is not None:
+                self.__h2.close()
+                self.__h2 = None
+            if self.__clientSocket is not None:
                 self.__clientSocket.close()
             try:
                 ip: str = gethostbyname(urlHost)
             except gaierror:
                 raise ValueError(f"Could not resolve host: {urlHost}")
             clientSocket: socket = socket(AF_INET, SOCK_STREAM)
-            if self.currConnection.url.scheme == "https" or self.isSecure:
-                self.__clientSocket: SSLSocket = create_default_context().wrap_socket(clientSocket,
-                                                                                      server_hostname=urlHost)
+            isSecure: bool = self.currConnection.url.scheme == "https" or self.isSecure
+            if isSecure:
+                with sslContextLock:
+                    # The context may be shared with conversations that don't speak HTTP/2, so the protocols are set
+                    #   for every socket, not only the ones offering HTTP/2.
+                    if self.useHttp2 and isHttp2Allowed:
+                        from httpH2 import alpnProtocols
+                        self.sslContext.set_alpn_protocols(alpnProtocols)
+                    else:
+                        self.sslContext.set_alpn_protocols(["http/1.1"])
+                    self.__clientSocket: SSLSocket = self.sslContext.wrap_socket(clientSocket, server_hostname=urlHost)
                 clientSocket.close()
             else:
                 self.__clientSocket = clientSocket
+            # The TLS handshake is done inside connect, so this timeout covers it as well.
+            self.__clientSocket.settimeout(self.__getRemainingTime())
             self.__clientSocket.connect((ip, self.port))
-            self.__clientSocket.settimeout(self.packetRecvTimeOut)
+            self.__socketHost = urlHost
+            self.keepAlive = True
+            if isSecure and self.useHttp2 and self.__clientSocket.selected_alpn_protocol() == "h2":
+                from httpH2 import H2Transport
+                self.__h2 = H2Transport(self.__clientSocket, "https",
+                                        self.receiveSize if self.receiveSize > 0 else defaultRecvSize)
 
     def getLastConnectionUrl(self) -> URL:
         if self.connectionList:
@@ -115,41 +309,126 @@ class HttpConversation:
         else:
             return None
 
+    def __isReplaying(self) -> bool:
+        return self.captureArchive is not None and not self.captureArchive.isRecording
+
+    def __isRecording(self) -> bool:
+        return self.captureArchive is not None and self.captureArchive.isRecording
+
     def __sendRecv(self) -> bytes:
-        self.__changeHostIfNeeded()
-        try:
-            self.__clientSocket.send(str(self.currConnection.request).encode())
-        except Exception as e:  # TODO add specific exception
-            raise e
-        # startTime: float = timer()
-        # receivedHeaders: bool = False
-        # isFirstPacket: bool = True
+        if self.__isReplaying():
+            data: bytes = self.__replay()
+        else:
+            startTime: float = monotonic()
+            data: bytes = self.__sendRecvNetwork()
+            if self.__isRecording():
+                self.captureArchive.record(self.currConnection.request, data, self.__isBodySkipped,
+                                           monotonic() - startTime)
+        self.__recordData(data, self.currIndex, self.currConnection.name)
+        return data
+
+    # Returns the recorded response to the current request, with its body skipped like __sendRecvNetwork would.
+    def __replay(self) -> bytes:
+        result: Union[tuple[bytes, bool], None] = self.captureArchive.replay(self.currConnection.request)
+        if result is None:
+            raise LookupError(f"No recorded response for {self.captureArchive.getKey(self.currConnection.request)}")
+        data, self.__isBodySkipped = result
+        self.__headTime = monotonic()
+        headLength: int = data.find(b"\r\n\r\n") + 4
+        if self.currConnection.htmlOnly and not self.__isBodySkipped and headLength > 3:
+            head: Response = parseResponse(data[:headLength], self.currConnection.url, parseBody=False)
+            if not isHtmlContentType(head.getContentType()):
+                self.__isBodySkipped = True
+                data = data[:headLength]
+        return data
 
+    def __sendRecvNetwork(self) -> bytes:
+        self.__changeHostIfNeeded()
+        if self.__h2 is not None:
+            # The headers and the body of a stream arrive interleaved with other streams, so the whole exchange gets
+            #   the request deadline.
+            result = self.__h2.exchange([(self.currConnection.request, self.currConnection.htmlOnly)],
+                                        self.__requestDeadline)[0]
+            if isinstance(result, Exception):
+                raise result
+            data, self.__isBodySkipped = result
+            self.__headTime = monotonic()
+            return data
+        self.__clientSocket.settimeout(self.__getRemainingTime())
+        self.__clientSocket.sendall(str(self.currConnection.request).encode())
+        self.__isBodySkipped = False
         data = b""
+        headLength: int = -1  # The length of the status line and headers, known once they were all received.
+        bodyLength: int = -1  # Stays -1 if the body is chunked or ends when the connection is closed.
+        # Finds the end of a chunked body. The decoded bytes aren't kept, parseResponse decodes the body again.
+        decoder: Union[ChunkedDecoder, None] = None
         isHtml: bool = False
-        while b"0\r\n\r\n" not in data:
+        while True:
+            # A server that keeps trickling bytes never hits the packet timeout, so the deadline is checked as well.
+            #   Once the headers arrived, only the deadline of the whole request is left for the body.
+            remainingTime: float = self.__getRemainingTime(self.__deadline if headLength == -1 else
+                                                           self.__requestDeadline)
+            self.__clientSocket.settimeout(min(self.packetRecvTimeOut, remainingTime))
             try:
-                if self.receiveSize > 0:
-                    data += self.__clientSocket.recv(self.receiveSize)
-                else:
-                    data += self.__clientSocket.recv()
+                packet: bytes = self.__clientSocket.recv(self.receiveSize if self.receiveSize > 0 else defaultRecvSize)
             except TimeoutError:
+                if remainingTime < self.packetRecvTimeOut:
+                    raise TimeoutError(f"Request deadline exceeded for {self.currConnection.url}")
                 print(f"{bColors.WARNING}Packet receive ended on timeout.{bColors.ENDC}")
                 break
-            if not isHtml:
-                if b"<html" in data:
-                    isHtml = True
-            if isHtml:
-                if b"</html>" in data:
+            if not packet:  # The server closed the connection.
+                self.keepAlive = False
+                break
+            data += packet
+            if headLength == -1 and b"\r\n\r\n" in data:
+                self.__headTime = monotonic()
+                headLength = data.index(b"\r\n\r\n") + 4
+                head: Response = parseResponse(data[:headLength], self.currConnection.url, parseBody=False)
+                bodyLength = getResponseBodyLength(head, self.currConnection.requestType)
+                if bodyLength == -1 and "chunked" in head.headers.get("transfer-encoding", "").lower():
+                    decoder = ChunkedDecoder()
+                packet = data[headLength:]
+                if self.currConnection.htmlOnly and not isHtmlContentType(head.getContentType()):
+                    self.__isBodySkipped = True
+                    if self.nonHtmlPolicy == "abort" or bodyLength == -1 or bodyLength > self.maxDrainSize:
+                        # Closing is the only way to stop the server from sending the rest of the body.
+                        self.__clientSocket.close()
+                        self.__clientSocket = None
+                        break
+            if decoder is not None:
+                decoder.decode(packet)
+            if headLength != -1:
+                if bodyLength != -1 and len(data) - headLength >= bodyLength:
                     break
-        self.totalData += data
-        if self.log:
-            self.__logData(data, f"{self.currIndex}{self.currConnection.name}_response.txt")
+                if decoder is not None and decoder.isDone:
+                    break
+                if bodyLength == -1 and decoder is None:
+                    if not isHtml:
+                        if b"<html" in data:
+                            isHtml = True
+                    if isHtml:
+                        if b"</html>" in data:
+                            break
+        if self.__isBodySkipped:
+            data = data[:headLength]
+        elif decoder is not None and not decoder.isDone:
+            self.keepAlive = False
+            raise ConnectionError(f"The response of {self.currConnection.url} ended before its last chunk")
+        elif bodyLength != -1 and len(data) - headLength < bodyLength:
+            # The rest of the body may still arrive on the socket, where it would be read as the next response.
+            self.keepAlive = False
+            raise ConnectionError(f"The response of {self.currConnection.url} ended after {len(data) - headLength} "
+                                  f"of {bodyLength} bytes")
         return data
 
+    def __recordData(self, data: bytes, index: int, name: str) -> None:
+        if self.connectionList.policy == "all":
+            self.totalData += data
+        if self.log:
+            self.__logData(data, f"{index}{name}_response.txt")
+
     def __logData(self, data, fileName: str):
-        if not os.path.exists(self.logLocation):
-            os.mkdir(self.logLocation)
+        os.makedirs(self.logLocation, exist_ok=True)
         with open(f"{self.logLocation}/{fileName}", 'w', encoding="ISO-8859-1") as f:
             if type(data) is bytes:
                 data = data.decode("ISO-8859-1")
@@ -175,38 +454,468 @@ class HttpConversation:
                 statusLine = f"{bColors.FAIL}{statusLine}"
         print(f"Status code: {statusLine}{bColors.ENDC}")
 
-    def mapDomain(self, url: Union[str, URL], mapSize: int = 1, sleepTime: float = 0) -> None:
+    # Streams the body of url into targetPath in reads of bufferSize bytes, without decoding it or keeping it in memory,
+    #   and returns the size of the file.
+    # The body is written to "{targetPath}.part" first. If the download is interrupted, the next call resumes it with a
+    #   Range request, and If-Range makes the server send the whole file again if it changed in the meantime.
+    # The deadline (see getTimeOut) covers the response headers, after them every read may take up to requestTimeOut.
+    def download(self, url: Union[str, URL], targetPath: str, bufferSize: int = 65536, resume: bool = True) -> int:
         if isinstance(url, str):
             url: URL = URL(url)
-        if mapSize != 0:
-            domain: str = url.domain
-            startIndex: int = self.currIndex + 1
-            self.converse(url)
-            sleep(sleepTime)
-            finishIndex: int = self.currIndex
-            connectionQueue: list[Connection] = []
-            urlList: list[URL] = []
-            # If the connection is a redirect, the connectionList will have more than one connection.
-            for i in range(startIndex, finishIndex + 1):
-                connection: Connection = self.connectionList[i]
-                urlList.extend(getLinksFromHTML(connection.response.body))
-            for url in urlList:
-                if len(connectionQueue) + len(self.connectionList) > mapSize:
-                    break
-                if url.domain == domain and (url.scheme == "https" or url.scheme == "") and \
-                        url not in self.cookieJar and not isFileUrl(url):
-                    connectionQueue.append(Connection(url, 'GET', getUrlName(url)))
-                    self.cookieJar.visit(url)
-            for connection in connectionQueue:
-                self.mapDomain(connection.url, mapSize - 1)
-        if mapSize == 0:
-            print(f"{bColors.OKGREEN}Done.{bColors.ENDC}")
+        partPath: str = f"{targetPath}.part"
+        validatorPath: str = f"{partPath}.validator"
+        offset: int = 0
+        headers: dict[str, str] = {"Accept-Encoding": "identity"}
+        if resume and os.path.exists(partPath) and os.path.exists(validatorPath):
+            with open(validatorPath, "r") as f:
+                validator: str = f.read().strip()
+            offset = os.path.getsize(partPath)
+            if offset > 0 and validator:
+                headers["Range"] = f"bytes={offset}-"
+                headers["If-Range"] = validator
+            else:
+                offset = 0
+        response, data = self.__requestHead(Connection(url, "GET", getUrlName(url), headers=headers), bufferSize)
+        if "location" in response.headers or response.statusCode == "416":
+            # The (small) body of these responses isn't read, so the connection can't be reused.
+            self.keepAlive = False
+            if "location" in response.headers:
+                if self.maxReferrals <= 0:
+                    raise ValueError("Too many redirects.")
+                self.maxReferrals -= 1
+                try:
+                    return self.download(response.headers["location"], targetPath, bufferSize, resume)
+                finally:
+                    self.maxReferrals += 1
+            # 416 means the range starts at or after the end of the file, so the part file might be complete.
+            contentRange: str = response.headers.get("content-range", "")
+            if contentRange and parseContentRange(contentRange)[2] == offset:
+                return self.__finishDownload(partPath, targetPath)
+            return self.download(url, targetPath, bufferSize, resume=False)
+        if response.statusCode == "206":
+            start, end, total = parseContentRange(response.headers.get("content-range", ""))
+            if start != offset:
+                self.keepAlive = False
+                raise ValueError(f"Got range {start}-{end} of {url} instead of {offset}-")
+        elif response.statusCode == "200":
+            offset = 0
+            total: int = getResponseBodyLength(response, "GET")
+        else:
+            self.keepAlive = False
+            raise ConnectionError(f"Could not download {url}: {response.statusCode} {response.statusMessage}")
+        with open(validatorPath, "w") as f:
+            f.write(getRangeValidator(response))
+        with open(partPath, "r+b" if offset > 0 else "wb") as f:
+            f.seek(offset)
+            f.truncate()
+            self.__streamBody(response, data, bufferSize, f.write)
+            fileSize: int = f.tell()
+        if total != -1 and fileSize != total:
+            self.keepAlive = False
+            raise ConnectionError(f"Download of {url} is incomplete ({fileSize}/{total} bytes), call again to resume")
+        return self.__finishDownload(partPath, targetPath)
+
+    @staticmethod
+    def __finishDownload(partPath: str, targetPath: str) -> int:
+        os.replace(partPath, targetPath)
+        os.remove(f"{partPath}.validator")
+        return os.path.getsize(targetPath)
+
+    # Downloads bytes start to end (inclusive) of url into the file descriptor at the same positions, and returns the
+    #   number of bytes written. onWrite is called with the size of every write.
+    # With a validator (see getRangeValidator) the server is asked to answer with the whole file if it changed, which
+    #   raises a ValueError instead of mixing two versions of the file.
+    def downloadRange(self, url: Union[str, URL], fileDescriptor: int, start: int, end: int, validator: str = "",
+                      bufferSize: int = 65536, onWrite: Callable[[int], None] = None) -> int:
+        if isinstance(url, str):
+            url: URL = URL(url)
+        headers: dict[str, str] = {"Accept-Encoding": "identity", "Range": f"bytes={start}-{end}"}
+        if validator:
+            headers["If-Range"] = validator
+        response, data = self.__requestHead(Connection(url, "GET", getUrlName(url), headers=headers), bufferSize)
+        if response.statusCode != "206" or parseContentRange(response.headers.get("content-range", ""))[0] != start:
+            self.keepAlive = False
+            raise ValueError(f"Got {response.statusCode} {response.statusMessage} instead of range {start}-{end} "
+                             f"of {url}")
+        position: int = start
+
+        def writeAtPosition(packet: bytes) -> None:
+            nonlocal position
+            positionedWrite(fileDescriptor, packet, position)
+            position += len(packet)
+            if onWrite is not None:
+                onWrite(len(packet))
+
+        self.__streamBody(response, data, bufferSize, writeAtPosition)
+        if position != end + 1:
+            self.keepAlive = False
+            raise ConnectionError(f"Range {start}-{end} of {url} is incomplete ({position - start} bytes)")
+        return position - start
+
+    # Sends the request of the connection and receives the status line and headers of the response.
+    # Returns the parsed head and the bytes that were received after it.
+    def __requestHead(self, connection: Connection, bufferSize: int) -> tuple[Response, bytes]:
+        self.__startConnection(connection)
+        startTime: float = monotonic()
+        if self.__isReplaying():
+            # The whole response is replayed at once, __streamBody doesn't read anything more.
+            data: bytes = self.__replay()
+        else:
+            try:
+                self.__changeHostIfNeeded(isHttp2Allowed=False)
+                self.__clientSocket.settimeout(self.__getRemainingTime())
+                self.__clientSocket.sendall(str(self.currConnection.request).encode())
+                data: bytes = b""
+                while b"\r\n\r\n" not in data:
+                    self.__clientSocket.settimeout(self.__getRemainingTime())
+                    packet: bytes = self.__clientSocket.recv(bufferSize)
+                    if not packet:
+                        raise ConnectionError(f"Connection closed before the response headers of {connection.url}")
+                    data += packet
+            except retryableErrors:
+                self.keepAlive = False
+                raise
+        headLength: int = data.index(b"\r\n\r\n") + 4
+        response: Response = parseResponse(data[:headLength], connection.url, parseBody=False)
+        if self.__isRecording():
+            if response.statusCode in ("200", "206"):
+                # The received bytes are kept until the body ends (see __streamBody), then recorded at once.
+                self.__capturedPackets = [data[:headLength]]
+                self.__captureStartTime = startTime
+            else:
+                # The callers don't read the body of other responses.
+                self.captureArchive.record(self.currConnection.request, data[:headLength], False,
+                                           monotonic() - startTime)
+        self.currConnection.response = response
+        if self.log:
+            self.__logData(response, f"{self.currIndex}{self.currConnection.name}_response.txt")
+        self.__processResponseHead()
+        return response, data[headLength:]
+
+    # Receives the rest of the body of the response (data is what was already received after the head), passes it to
+    #   write as it arrives, and stops at the end of the body according to the response's framing.
+    def __streamBody(self, response: Response, data: bytes, bufferSize: int, write: Callable[[bytes], None]) -> None:
+        bodyLength: int = getResponseBodyLength(response, "GET")
+        decoder: Union[ChunkedDecoder, None] = None
+        if bodyLength == -1 and "chunked" in response.headers.get("transfer-encoding", "").lower():
+            decoder = ChunkedDecoder()
+        receivedLength: int = 0
+        packet: bytes = data
+        while True:
+            if bodyLength != -1:
+                packet = packet[:bodyLength - receivedLength]
+            receivedLength += len(packet)
+            write(decoder.decode(packet) if decoder is not None else packet)
+            if self.__capturedPackets:
+                self.__capturedPackets.append(packet)
+            # A replayed response is whole, there is nothing more to receive.
+            if receivedLength == bodyLength or (decoder is not None and decoder.isDone) or self.__isReplaying():
+                self.__recordCapturedPackets()
+                return
+            self.__clientSocket.settimeout(self.requestTimeOut)
+            try:
+                packet = self.__clientSocket.recv(bufferSize)
+            except retryableErrors:
+                self.keepAlive = False
+                self.__capturedPackets = []
+                raise
+            if not packet:
+                self.keepAlive = False
+                if decoder is not None:
+                    self.__capturedPackets = []
+                    raise ConnectionError(f"Connection closed before the last chunk of {response.url}")
+                self.__recordCapturedPackets()
+                return
+
+    # Records the response streamed by __streamBody, only once its body was received, so a download that failed
+    #   halfway isn't replayed.
+    def __recordCapturedPackets(self) -> None:
+        if self.__capturedPackets:
+            self.captureArchive.record(self.currConnection.request, b"".join(self.__capturedPackets), False,
+                                       monotonic() - self.__captureStartTime)
+            self.__capturedPackets = []
+
+    # With useRobots, robots.txt is fetched first: its Disallow rules are applied to the links, its Crawl-delay is used
+    #   if longer than sleepTime, and the URLs of its sitemaps (or of /sitemap.xml) seed the frontier, newest first.
+    # With a linkGraph, every fetched page and every link found in it are recorded to it.
+    # Pages are fetched by up to `workers` conversations at once (this one and copies of it sharing its cookies), as
+    #   the scheduler allows. Without a scheduler, a host gets a request every sleepTime seconds at most, or every
+    #   Crawl-delay seconds of its robots.txt if that is longer.
+    # With skipDuplicates, the links of pages that are near-duplicates of pages seen before aren't followed, and links
+    #   matching URL patterns that mostly returned near-duplicates are deferred or skipped (see DuplicateFilter).
+    def mapDomain(self, url: Union[str, URL], mapSize: int = 1, sleepTime: float = 0, useRobots: bool = True,
+                  linkGraph: LinkGraph = None, workers: int = 1, scheduler: HostScheduler = None,
+                  skipDuplicates: bool = True) -> None:
+        if isinstance(url, str):
+            url: URL = URL(url)
+        domain: str = url.domain
+        if scheduler is None:
+            scheduler = HostScheduler(1 / sleepTime if sleepTime > 0 else inf)
+        # Every URL comes with its depth, the number of links followed to it from url (sitemap seeds are roots too),
+        #   and the number of times its host throttled it.
+        scheduler.push(domain, (url, 0, 0))
+        self.cookieJar.visit(url)
+        robots: RobotsRules = self.__fetchRobots(url) if useRobots else RobotsRules()
+        if robots.crawlDelay is not None:
+            scheduler.setCrawlDelay(domain, robots.crawlDelay)
+        if useRobots and mapSize > 1:
+            for seed in self.__getSitemapSeeds(url, robots, mapSize - 1):
+                if seed not in self.cookieJar:
+                    scheduler.push(domain, (seed, 0, 0))
+                    self.cookieJar.visit(seed)
+        conversations: Queue[HttpConversation] = Queue()
+        conversations.put(self)
+        for i in range(1, workers):
+            conversations.put(self.__newWorker(i))
+        try:
+            # Every page is the list of connections of its redirect chain.
+            # With a parse pool, pages wait here while their bodies are being parsed and the next pages are fetched.
+            pendingPages: deque[tuple[URL, int, list[Connection]]] = deque()
+            fetches: dict[Future, tuple[str, URL, int, int]] = dict()
+            pagesLeft: int = mapSize
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # Pages still being fetched or parsed when the budget runs out are finished, but no new ones are
+                #   started.
+                while fetches or pendingPages or (pagesLeft > 0 and scheduler):
+                    # Parsed pages are handled before fetching more, so the next fetches are chosen knowing their links.
+                    isFetchPossible: bool = bool(scheduler) and len(fetches) < min(workers, pagesLeft)
+                    if pendingPages and ((not fetches and not isFetchPossible) or
+                                         self.__isPageParsed(pendingPages[0][2])):
+                        pageUrl, depth, page = pendingPages.popleft()
+                        try:
+                            links: list[URL] = self.__getPageLinks(page, domain)
+                        except crawlErrors as e:
+                            # A page whose body can't be parsed is left out like one that can't be fetched, it was
+                            #   already counted in the budget. Once its links are read, its parse results are known to
+                            #   be there for the graph and the duplicate filter.
+                            print(f"{bColors.WARNING}Could not parse {pageUrl} ({type(e).__name__}: {e})."
+                                  f"{bColors.ENDC}")
+                            if linkGraph is not None:
+                                linkGraph.addNode(pageUrl, depth)
+                            continue
+                        if linkGraph is not None:
+                            self.__addToLinkGraph(linkGraph, pageUrl, depth, page, links)
+                        if skipDuplicates and self.__isDuplicatePage(pageUrl, page):
+                            continue
+                        for link in links:
+                            if link.domain == domain and (link.scheme == "https" or link.scheme == "") and \
+                                    link not in self.cookieJar and not isFileUrl(link) and robots.isAllowed(link):
+                                action: str = self.duplicateFilter.getAction(link) if skipDuplicates else "FETCH"
+                                if action == "SKIP":
+                                    continue
+                                # Deferred links don't take the place of other links in the budget.
+                                if action == "FETCH" and \
+                                        len(scheduler) - scheduler.deferredNum + len(fetches) >= pagesLeft:
+                                    break
+                                scheduler.push(link.domain, (link, depth + 1, 0), isDeferred=action == "DEFER")
+                                self.cookieJar.visit(link)
+                        continue
+                    while len(fetches) < min(workers, pagesLeft):
+                        task: Union[tuple[str, tuple[URL, int, int]], None] = scheduler.pop()
+                        if task is None:
+                            break
+                        host, (pageUrl, depth, throttlesNum) = task
+                        fetches[executor.submit(self.__fetchPageWith, conversations, pageUrl)] = \
+                            (host, pageUrl, depth, throttlesNum)
+                    isFetchPossible = bool(scheduler) and len(fetches) < min(workers, pagesLeft)
+                    # Waits for a fetch to end, the next pending page to be parsed or the next task to become eligible.
+                    waitTime: float = scheduler.getWaitTime() if isFetchPossible else inf
+                    waitedFutures: list[Future] = list(fetches)
+                    if pendingPages:
+                        waitedFutures.extend(connection.parsed for connection in pendingPages[0][2]
+                                             if connection.parsed is not None)
+                    if waitedFutures:
+                        wait(waitedFutures, None if waitTime == inf else waitTime, FIRST_COMPLETED)
+                    elif waitTime != inf:
+                        sleep(waitTime)
+                    for future in [future for future in fetches if future.done()]:
+                        host, pageUrl, depth, throttlesNum = fetches.pop(future)
+                        try:
+                            page: Union[list[Connection], None] = future.result()
+                        except crawlErrors as e:
+                            # A page that can't be fetched is left out (with status 0 in the graph), and its host is
+                            #   slowed down like a throttling one, in case it's overloaded.
+                            retryAfter: float = scheduler.penalize(host)
+                            print(f"{bColors.WARNING}Could not fetch {pageUrl} ({type(e).__name__}: {e}), slowing down "
+                                  f"{host} for {retryAfter:.2f}s.{bColors.ENDC}")
+                            if linkGraph is not None:
+                                linkGraph.addNode(pageUrl, depth)
+                            pagesLeft -= 1
+                            continue
+                        if page is None:
+                            continue
+                        response: Response = page[-1].response
+                        if response.statusCode in throttleStatusCodes:
+                            retryAfter: float = scheduler.penalize(host, getRetryAfter(response))
+                            if throttlesNum + 1 < self.maxRetries:
+                                print(f"{bColors.WARNING}{host} is throttling, retrying {pageUrl} in "
+                                      f"{retryAfter:.2f}s.{bColors.ENDC}")
+                                scheduler.push(host, (pageUrl, depth, throttlesNum + 1), isFirst=True)
+                                continue
+                        else:
+                            scheduler.reward(host)
+                        pagesLeft -= 1
+                        pendingPages.append((pageUrl, depth, page))
+        finally:
+            while not conversations.empty():
+                conversation: HttpConversation = conversations.get()
+                if conversation is not self:
+                    conversation.close()
+        print(f"{bColors.OKGREEN}Done.{bColors.ENDC}")
+
+    # Returns a copy of this conversation for a mapDomain worker. It shares the cookies, the parse pool and what was
+    #   learned about the hosts, but has its own socket, history and log folder.
+    def __newWorker(self, index: int) -> "HttpConversation":
+        conversation: HttpConversation = HttpConversation(
+            port=self.port, packetRecvTimeOut=self.packetRecvTimeOut, log=self.log,
+            sendOptionalHeaders=self.sendOptionalHeaders, acceptEncoding=self.acceptEnc, recvSize=self.receiveSize,
+            logLocation=os.path.join(self.logLocation, f"worker{index}"), maxReferrals=self.maxReferrals,
+            maxRetries=self.maxRetries, isSecure=self.isSecure, requestTimeOut=self.requestTimeOut,
+            retryBackoff=self.retryBackoff, maxBackoff=self.maxBackoff, adaptiveTimeOut=self.adaptiveTimeOut,
+            parsePool=self.parsePool, nonHtmlPolicy=self.nonHtmlPolicy, maxDrainSize=self.maxDrainSize,
+            historyPolicy=self.connectionList.policy, historySize=self.connectionList.size, useHttp2=self.useHttp2,
+            sslContext=self.sslContext, captureArchive=self.captureArchive)
+        conversation.cookieJar = self.cookieJar
+        conversation.latencyTracker = self.latencyTracker
+        conversation.contentTypeMemo = self.contentTypeMemo
+        return conversation
+
+    # Fetches the page with a free conversation of the pool, conversations aren't thread safe.
+    @staticmethod
+    def __fetchPageWith(conversations: Queue, url: URL) -> Union[list[Connection], None]:
+        conversation: HttpConversation = conversations.get()
+        try:
+            return conversation.__fetchPage(url)
+        finally:
+            conversations.put(conversation)
+
+    # Records the fingerprint of the page in the duplicate filter and returns whether it's a near-duplicate.
+    def __isDuplicatePage(self, pageUrl: URL, page: list[Connection]) -> bool:
+        connection: Connection = page[-1]
+        if connection.response.isBodySkipped or connection.response.statusCode != "200":
+            return False
+        if connection.parsed is not None:
+            fingerprint: int = connection.parsed.result().fingerprint
+        else:
+            fingerprint: int = getPageFingerprint(connection.response.body)
+        original: Union[str, None] = self.duplicateFilter.check(pageUrl, fingerprint)
+        if original is not None:
+            print(f"{bColors.WARNING}{pageUrl} is a near-duplicate of {original}, "
+                  f"not following its links.{bColors.ENDC}")
+        return original is not None
+
+    # The page is recorded under the URL it was requested by, with the status and body size of the end of its
+    #   redirect chain.
+    @staticmethod
+    def __addToLinkGraph(linkGraph: LinkGraph, pageUrl: URL, depth: int, page: list[Connection],
+                         links: list[URL]) -> None:
+        pageId: int = linkGraph.addNode(pageUrl, depth)
+        connection: Connection = page[-1]
+        if connection.response.isBodySkipped:
+            contentLength: str = connection.response.headers.get("content-length", "")
+            size: int = int(contentLength) if contentLength.isdigit() else -1
+        elif connection.parsed is not None:
+            size: int = connection.parsed.result().bodySize
+        else:
+            size: int = len(connection.response.body)
+        linkGraph.setNodeInfo(pageId, int(connection.response.statusCode), size)
+        linkGraph.addEdges(pageId, [linkGraph.addNode(link, depth + 1) for link in links])
+
+    # Missing or unreachable robots.txt files allow everything, and so do ones missing from a replayed archive.
+    def __fetchRobots(self, url: URL) -> RobotsRules:
+        robotsUrl: URL = URL(f"{url.getSchemeStr()}{url.domain}/robots.txt")
+        with TemporaryDirectory() as tempDir:
+            robotsPath: str = os.path.join(tempDir, "robots.txt")
+            try:
+                self.download(robotsUrl, robotsPath, resume=False)
+            except crawlErrors as e:
+                print(f"{bColors.WARNING}No robots.txt ({type(e).__name__}: {e}).{bColors.ENDC}")
+                return RobotsRules()
+            with open(robotsPath, "r", encoding="ISO-8859-1") as f:
+                return parseRobots(f)
+
+    # Returns up to maxSeeds allowed URLs of the domain from the sitemaps, the most recently modified first.
+    # Sitemaps are downloaded to disk and parsed from there, so they are never held in memory as a whole.
+    def __getSitemapSeeds(self, url: URL, robots: RobotsRules, maxSeeds: int, maxSitemaps: int = 20) -> list[URL]:
+        sitemapUrls: deque[str] = deque(robots.sitemaps or [f"{url.getSchemeStr()}{url.domain}/sitemap.xml"])
+
+        def iterEntries():
+            sitemapsLeft: int = maxSitemaps
+            with TemporaryDirectory() as tempDir:
+                sitemapPath: str = os.path.join(tempDir, "sitemap")
+                while sitemapUrls and sitemapsLeft > 0:
+                    sitemapsLeft -= 1
+                    try:
+                        self.download(sitemapUrls.popleft(), sitemapPath, resume=False)
+                    except crawlErrors as e:
+                        print(f"{bColors.WARNING}Skipping sitemap ({type(e).__name__}: {e}).{bColors.ENDC}")
+                        continue
+                    for entry in iterSitemap(sitemapPath):
+                        if entry.isSitemap:
+                            sitemapUrls.append(entry.loc)
+                        else:
+                            yield entry
+
+        def iterSeeds():
+            for entry in iterEntries():
+                try:
+                    seed: URL = URL(entry.loc)
+                except ValueError:
+                    continue
+                if seed.domain == url.domain and seed != url and not isFileUrl(seed) and robots.isAllowed(seed):
+                    yield seed, entry.lastmod
+
+        # Entries without lastmod ("") come last.
+        return [seed for seed, lastmod in nlargest(maxSeeds, iterSeeds(), key=lambda seedItem: seedItem[1])]
+
+    # Returns the connections of the redirect chain of the page, or None if it was skipped for not being HTML.
+    def __fetchPage(self, url: URL) -> Union[list[Connection], None]:
+        action: str = self.contentTypeMemo.getAction(url)
+        if action == "SKIP":
+            print(f"{bColors.WARNING}Skipping {url}, its URL pattern only returned non-HTML content.{bColors.ENDC}")
+            return None
+        if action == "HEAD":
+            self.converse(Connection(url, "HEAD", getUrlName(url)))
+            contentType: str = self.currConnection.response.getContentType()
+            self.contentTypeMemo.record(url, contentType)
+            if not isHtmlContentType(contentType):
+                return None
+        startIndex: int = self.currIndex + 1
+        self.converse(Connection(url, "GET", getUrlName(url), htmlOnly=True))
+        self.contentTypeMemo.record(url, self.currConnection.response.getContentType())
+        return self.connectionList[startIndex:self.currIndex + 1]
+
+    @staticmethod
+    def __isPageParsed(page: list[Connection]) -> bool:
+        return all(connection.parsed is None or connection.parsed.done() for connection in page)
+
+    # Blocks until the bodies of the page are parsed when a parse pool is used.
+    @staticmethod
+    def __getPageLinks(page: list[Connection], domain: str) -> list[URL]:
+        links: list[URL] = []
+        for connection in page:
+            if connection.response.isBodySkipped:
+                continue
+            if connection.parsed is None:
+                links.extend(getLinksFromHTML(connection.response.body))
+            else:
+                # Rebuilding a URL is the expensive part, so links of other domains are dropped before it.
+                links.extend(URL(link) for link in connection.parsed.result().links if domain in link)
+        return links
 
     def __enter__(self):
         return self
 
+    def close(self) -> None:
+        if self.__h2 is not None:
+            self.__h2.close()
+            self.__h2 = None
+        if self.__clientSocket is not None:
+            self.__clientSocket.close()
+            self.__clientSocket = None
+        self.connectionList.close()
+
     def __exit__(self, exc_type, exc_value, traceback):
         if self.log:
             self.__logData(self.totalData.decode("ISO-8859-1"), f"allData.txt")
-        if self.__clientSocket is not None:
-            self.__clientSocket.close()
+        self.close()
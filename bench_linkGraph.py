@@ -0,0 +1,52 @@
+# Builds a random link graph (100k pages with 20 links each by default) and measures its memory and the time of
+#   building the adjacency, the queries and the binary round trip.
+# Usage: python bench_linkGraph.py [pagesNum] [linksPerPage]
+import os
+import sys
+import tracemalloc
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from httpLinkGraph import LinkGraph
+from httpUtils import URL
+
+
+def main():
+    pagesNum: int = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    linksPerPage: int = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    random: Random = Random(0)
+    urls: list[URL] = [URL(f"example.com/section{i % 50}/page{i}") for i in range(pagesNum)]
+    tracemalloc.start()
+    startTime: float = perf_counter()
+    graph: LinkGraph = LinkGraph()
+    for url in urls:
+        graph.addNode(url)
+    for pageId in range(pagesNum):
+        graph.addEdges(pageId, [random.randrange(pagesNum) for _ in range(linksPerPage)])
+        graph.setNodeInfo(pageId, 200, 1000)
+    buildTime: float = perf_counter() - startTime
+    graphMemory: int = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    startTime = perf_counter()
+    graph.getAdjacency()
+    adjacencyTime: float = perf_counter() - startTime
+    startTime = perf_counter()
+    graph.getInDegrees()
+    graph.getOrphans([0])
+    graph.getClickDepths(0)
+    queriesTime: float = perf_counter() - startTime
+    with TemporaryDirectory() as tempDir:
+        graphPath: str = os.path.join(tempDir, "graph.bin")
+        startTime = perf_counter()
+        graph.saveBinary(graphPath)
+        LinkGraph.loadBinary(graphPath)
+        roundTripTime: float = perf_counter() - startTime
+        fileSize: int = os.path.getsize(graphPath)
+    print(f"{len(graph)} nodes, {graph.getEdgesNum()} edges: {graphMemory / 2 ** 20:.1f} MiB in memory, "
+          f"{fileSize / 2 ** 20:.1f} MiB on disk")
+    print(f"build: {buildTime:.2f}s, adjacency: {adjacencyTime:.2f}s, queries: {queriesTime:.2f}s, "
+          f"save + load: {roundTripTime:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+# Measures how parsing throughput scales with the number of parsing processes.
+# Every page is a gzip compressed, chunk-less response with the body of test_files/test_orefPage.txt.
+# Usage: python bench_parsePool.py [pages] [maxWorkers]
+import os
+import sys
+from gzip import compress
+from time import perf_counter
+from httpParsePool import ParsePool, parsePage
+from httpUtils import URL
+
+testFilesLocation = "test_files/"
+
+
+def buildResponse() -> bytes:
+    with open(f"{testFilesLocation}test_orefPage.txt", "rb") as f:
+        body: bytes = compress(f.read())
+    return b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\nContent-Encoding: gzip\r\n" + \
+        f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+
+
+def main():
+    pagesNum: int = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    maxWorkers: int = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    responseBytes: bytes = buildResponse()
+    url: URL = URL("https://www.oref.org.il/")
+    startTime: float = perf_counter()
+    for _ in range(pagesNum):
+        parsePage(responseBytes, url.urlStr)
+    baseline: float = pagesNum / (perf_counter() - startTime)
+    print(f"in process: {baseline:.1f} pages/s")
+    workers: int = 1
+    while workers <= maxWorkers:
+        with ParsePool(workers) as pool:
+            # Start the workers before measuring.
+            for future in [pool.submit(responseBytes, url) for _ in range(workers)]:
+                future.result()
+            startTime = perf_counter()
+            for future in [pool.submit(responseBytes, url) for _ in range(pagesNum)]:
+                future.result()
+            throughput: float = pagesNum / (perf_counter() - startTime)
+        print(f"{workers} workers: {throughput:.1f} pages/s ({throughput / baseline:.2f}x)")
+        workers *= 2
+
+
+if __name__ == '__main__':
+    main()
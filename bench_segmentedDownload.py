@@ -0,0 +1,75 @@
+# Downloads a file from a local server that limits every connection to a fixed bandwidth, with a growing number of
+#   segments, to show that the throughput grows with the number of connections.
+# Usage: python bench_segmentedDownload.py [fileMiB] [connectionKiBps] [maxSegments]
+import os
+import sys
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from time import perf_counter, sleep
+from HttpConversation import HttpConversation
+from httpDownloader import SegmentedDownloader
+
+fileContent: bytes = b""
+connectionBandwidth: int = 0
+
+
+class ThrottledRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", '"bench"')
+        self.send_header("Content-Length", str(len(fileContent)))
+        self.end_headers()
+
+    def do_GET(self):
+        start, end = 0, len(fileContent) - 1
+        if "Range" in self.headers:
+            rangeStart, rangeEnd = self.headers["Range"].removeprefix("bytes=").split("-")
+            start, end = int(rangeStart), int(rangeEnd) if rangeEnd else end
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(fileContent)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        blockSize: int = connectionBandwidth // 20
+        for blockStart in range(start, end + 1, blockSize):
+            self.wfile.write(fileContent[blockStart:min(end + 1, blockStart + blockSize)])
+            sleep(0.05)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    global fileContent, connectionBandwidth
+    fileSize: int = (int(sys.argv[1]) if len(sys.argv) > 1 else 8) * 2 ** 20
+    connectionBandwidth = (int(sys.argv[2]) if len(sys.argv) > 2 else 2048) * 2 ** 10
+    maxSegments: int = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    fileContent = os.urandom(fileSize)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ThrottledRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    with tempfile.TemporaryDirectory() as tempDir:
+        segmentsNum: int = 1
+        baseline: float = 0
+        while segmentsNum <= maxSegments:
+            targetPath: str = os.path.join(tempDir, f"file{segmentsNum}.bin")
+            with HttpConversation(port=server.server_address[1], isSecure=False, log=False) as conversation:
+                downloader = SegmentedDownloader(conversation, segmentsNum, minSegmentSize=1,
+                                                 onProgress=lambda *args: None)
+                startTime: float = perf_counter()
+                downloader.download("http://127.0.0.1/file.bin", targetPath)
+                throughput: float = fileSize / (perf_counter() - startTime) / 2 ** 20
+            baseline = baseline or throughput
+            with open(targetPath, "rb") as f:
+                assert f.read() == fileContent
+            print(f"{segmentsNum} segments: {throughput:.2f} MiB/s ({throughput / baseline:.2f}x)")
+            segmentsNum *= 2
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
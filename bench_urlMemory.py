@@ -0,0 +1,33 @@
+# Measures the memory held by URL objects parsed from test_files/test_orefPageUrls.txt, repeated up to the
+#   requested amount (100k by default), and the time it takes to build them and put them in a set.
+# Usage: python bench_urlMemory.py [urlsNum]
+import sys
+import tracemalloc
+from time import perf_counter
+from httpUtils import URL
+
+testFilesLocation = "test_files/"
+
+
+def main():
+    urlsNum: int = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with open(f"{testFilesLocation}test_orefPageUrls.txt", "r") as f:
+        # Every line is copied so the strings aren't shared between the repetitions, like in a real crawl.
+        urlStrs: list[str] = [line.strip() for line in f if line.strip()]
+    urlStrs = [(urlStrs[i % len(urlStrs)] + " ")[:-1] for i in range(urlsNum)]
+    tracemalloc.start()
+    startTime: float = perf_counter()
+    urls: list[URL] = [URL(urlStr) for urlStr in urlStrs]
+    buildTime: float = perf_counter() - startTime
+    urlsMemory: int = tracemalloc.get_traced_memory()[0]
+    startTime = perf_counter()
+    urlSet: set[URL] = set(urls)
+    setTime: float = perf_counter() - startTime
+    tracemalloc.stop()
+    print(f"{len(urls)} URLs ({len(urlSet)} unique): {urlsMemory / 2 ** 20:.1f} MiB, "
+          f"{urlsMemory / len(urls):.0f} bytes per URL (not counting the input strings)")
+    print(f"build: {buildTime:.2f}s, set: {setTime:.3f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+import threading
+from contextlib import contextmanager, ExitStack
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Callable, Iterator
+import pytest
+
+
+# Base of the handlers of the local test servers, the handlers only have to implement the methods they answer.
+class LocalRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # The conversations send the host in the request line ("GET 127.0.0.1/a HTTP/1.1"), so this is the path without it.
+    def getRequestedPath(self) -> str:
+        target: str = self.path.split("://")[-1]
+        return "/" + target.split("/", 1)[1] if "/" in target else "/"
+
+    def sendBody(self, body: bytes, contentType: str = "text/html", statusCode: int = 200) -> None:
+        self.send_response(statusCode)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+# Serves with the handler on a free port of 127.0.0.1 until the block ends, and yields the port.
+@contextmanager
+def runServer(handlerClass: type[BaseHTTPRequestHandler]) -> Iterator[int]:
+    httpServer: ThreadingHTTPServer = ThreadingHTTPServer(("127.0.0.1", 0), handlerClass)
+    threading.Thread(target=httpServer.serve_forever, args=(0.05,), daemon=True).start()
+    try:
+        yield httpServer.server_address[1]
+    finally:
+        httpServer.shutdown()
+        httpServer.server_close()
+
+
+# startServer(handlerClass) starts a server like runServer and returns its port, the servers stop when the test ends.
+@pytest.fixture
+def startServer() -> Iterator[Callable[[type[BaseHTTPRequestHandler]], int]]:
+    with ExitStack() as stack:
+        yield lambda handlerClass: stack.enter_context(runServer(handlerClass))
@@ -0,0 +1,191 @@
+import json
+import os
+import sys
+from argparse import ArgumentParser, Namespace
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from contextlib import redirect_stdout
+from hashlib import sha1
+from threading import Lock
+from time import monotonic
+from typing import Iterable, Iterator, TextIO, Union
+from HttpConversation import HttpConversation
+from httpUtils import URL, Connection, CookieJar, HostLatencyTracker, Response, getUrlName, getLinksFromHTML, \
+    isHtmlContentType
+
+# Returns the URLs of the lines as they are read, skipping empty lines and "#" comments.
+def readUrls(lines: Iterable[str]) -> Iterator[str]:
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+# Conversations for bulkFetch. A conversation is bound to a port and to TLS or plain sockets, so it is reused for URLs
+#   with the same scheme, host and port, which also reuses its keep-alive connection.
+# Up to maxIdle conversations are kept between fetches, the least recently used one is closed when there are more.
+class ConversationPool:
+    def __init__(self, maxIdle: int, **conversationArgs):
+        self.maxIdle: int = maxIdle
+        self.conversationArgs: dict = conversationArgs
+        self.cookieJar: CookieJar = CookieJar()
+        self.latencyTracker: HostLatencyTracker = HostLatencyTracker()
+        self.__idle: deque[tuple[tuple[bool, str, int], HttpConversation]] = deque()
+        self.__lock: Lock = Lock()
+
+    @staticmethod
+    def getKey(url: URL) -> tuple[bool, str, int]:
+        isSecure: bool = url.scheme != "http"
+        return isSecure, url.domain, int(url.port) if url.port else 443 if isSecure else 80
+
+    def acquire(self, url: URL) -> HttpConversation:
+        key: tuple[bool, str, int] = self.getKey(url)
+        with self.__lock:
+            for i in range(len(self.__idle) - 1, -1, -1):
+                if self.__idle[i][0] == key:
+                    conversation: HttpConversation = self.__idle[i][1]
+                    del self.__idle[i]
+                    return conversation
+        # Only the latest response is kept, so the memory of a conversation doesn't grow with the URLs it fetched.
+        conversation: HttpConversation = HttpConversation(port=key[2], isSecure=key[0], log=False, historyPolicy="last",
+                                                          historySize=1, **self.conversationArgs)
+        conversation.cookieJar = self.cookieJar
+        conversation.latencyTracker = self.latencyTracker
+        return conversation
+
+    def release(self, url: URL, conversation: HttpConversation) -> None:
+        with self.__lock:
+            self.__idle.append((self.getKey(url), conversation))
+            closed: Union[HttpConversation, None] = None
+            if len(self.__idle) > self.maxIdle:
+                closed = self.__idle.popleft()[1]
+        if closed is not None:
+            closed.close()
+
+    def close(self) -> None:
+        with self.__lock:
+            while self.__idle:
+                self.__idle.popleft()[1].close()
+
+
+# Fetches the URL and returns its record: the status, headers, time, size and SHA-1 digest of the body (decoded, like
+#   in ParsedPage), the links of HTML bodies and the path the body was saved to, if bodiesPath is given.
+# A skipped body (see htmlOnly) has no digest, and its size is the Content-Length if the response has one.
+# Bodies are saved by their digest, so a body that repeats is saved once.
+# Every URL ends in a record, whatever its fetch raised is written to the record's error instead of ending the run.
+# Redirects are followed here, each with a conversation of the pool for its URL, since a redirect may change the scheme
+#   or the port (http to https), which the conversation of the previous URL can't connect to.
+def fetchRecord(pool: ConversationPool, urlStr: str, bodiesPath: str = None, htmlOnly: bool = False,
+                maxRedirects: int = 10) -> dict:
+    record: dict = {"url": urlStr}
+    startTime: float = monotonic()
+    try:
+        url: URL = URL(urlStr)
+        redirectsLeft: int = maxRedirects
+        while True:
+            conversation: HttpConversation = pool.acquire(url)
+            try:
+                conversation.converse(Connection(url, "GET", getUrlName(url), htmlOnly=htmlOnly, followRedirects=False))
+                response: Response = conversation.currConnection.response
+            finally:
+                pool.release(url, conversation)
+            if "location" not in response.headers:
+                break
+            if redirectsLeft <= 0:
+                raise ValueError("Too many redirects.")
+            redirectsLeft -= 1
+            url = URL(response.headers["location"])
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+        record["elapsed"] = round(monotonic() - startTime, 6)
+        return record
+    record["elapsed"] = round(monotonic() - startTime, 6)
+    record.update(finalUrl=response.url.urlStr, statusCode=int(response.statusCode), headers=response.headers,
+                  isBodySkipped=response.isBodySkipped)
+    if response.isBodySkipped:
+        # Only the size the server announced is known, there is no digest of a body that wasn't received.
+        if response.headers.get("content-length", "").isdigit():
+            record["bodySize"] = int(response.headers["content-length"])
+        return record
+    bodyBytes: bytes = response.body.encode("ISO-8859-1")
+    digest: str = sha1(bodyBytes).hexdigest()
+    record.update(bodySize=len(bodyBytes), digest=digest)
+    if isHtmlContentType(response.getContentType()):
+        record["links"] = [link.urlStr for link in getLinksFromHTML(response.body)]
+    if bodiesPath is not None:
+        bodyPath: str = os.path.join(bodiesPath, digest)
+        if not os.path.exists(bodyPath):
+            with open(bodyPath, "wb") as f:
+                f.write(bodyBytes)
+        record["bodyPath"] = bodyPath
+    return record
+
+
+def writeRecords(output: TextIO, fetches: Iterable[Future]) -> int:
+    recordsNum: int = 0
+    for fetch in fetches:
+        output.write(json.dumps(fetch.result()) + "\n")
+        recordsNum += 1
+    output.flush()
+    return recordsNum
+
+
+# Fetches the URLs, up to concurrency at once, and writes a JSON line per URL to output as soon as it's done (so not
+#   in the order of the URLs). Returns the number of records written.
+# URLs are only read when there is a free worker, so memory stays the same however many URLs there are.
+def bulkFetch(urls: Iterable[str], output: TextIO, concurrency: int = 8, bodiesPath: str = None,
+              htmlOnly: bool = False, **conversationArgs) -> int:
+    if bodiesPath is not None:
+        os.makedirs(bodiesPath, exist_ok=True)
+    pool: ConversationPool = ConversationPool(concurrency, **conversationArgs)
+    recordsNum: int = 0
+    try:
+        with ThreadPoolExecutor(concurrency) as executor:
+            fetches: set[Future] = set()
+            for urlStr in urls:
+                if len(fetches) >= concurrency:
+                    done, fetches = wait(fetches, return_when=FIRST_COMPLETED)
+                    recordsNum += writeRecords(output, done)
+                fetches.add(executor.submit(fetchRecord, pool, urlStr, bodiesPath, htmlOnly))
+            recordsNum += writeRecords(output, wait(fetches).done)
+    finally:
+        pool.close()
+    return recordsNum
+
+
+def parseArguments(args: list[str] = None) -> Namespace:
+    parser: ArgumentParser = ArgumentParser(description="Fetch a list of URLs and write a JSON line per response.")
+    parser.add_argument("input", nargs="?", default="-", help="file with a URL per line, - for stdin (the default)")
+    parser.add_argument("-o", "--output", default="-", help="JSONL file to write, - for stdout (the default)")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="URLs fetched at once (default: 8)")
+    parser.add_argument("--bodies", metavar="DIRECTORY", help="save the bodies in this directory, named by digest")
+    parser.add_argument("--html-only", action="store_true", help="skip the bodies of non-HTML responses")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds per URL, retries included (default: 30)")
+    parser.add_argument("--retries", type=int, default=3, help="attempts per URL (default: 3)")
+    parser.add_argument("--http2", action="store_true", help="offer HTTP/2 to TLS servers (needs the h2 package)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't print the progress of the conversations")
+    arguments: Namespace = parser.parse_args(args)
+    if arguments.concurrency < 1:
+        parser.error("concurrency has to be at least 1")
+    return arguments
+
+
+def main(args: list[str] = None) -> int:
+    arguments: Namespace = parseArguments(args)
+    inputFile: TextIO = sys.stdin if arguments.input == "-" else open(arguments.input, "r", encoding="utf-8")
+    output: TextIO = sys.stdout if arguments.output == "-" else open(arguments.output, "w", encoding="utf-8")
+    # The conversations print their progress, which would mix with the records on stdout.
+    progress: TextIO = open(os.devnull, "w") if arguments.quiet else sys.stderr
+    try:
+        with redirect_stdout(progress):
+            bulkFetch(readUrls(inputFile), output, arguments.concurrency, arguments.bodies, arguments.html_only,
+                      requestTimeOut=arguments.timeout, maxRetries=arguments.retries, useHttp2=arguments.http2)
+    finally:
+        for f in (inputFile, output, progress):
+            if f not in (sys.stdin, sys.stdout, sys.stderr):
+                f.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
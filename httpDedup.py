@@ -0,0 +1,110 @@
+from collections import Counter
+from hashlib import blake2b
+from re import compile as compileRegex, Pattern, DOTALL
+from typing import Union
+from httpUtils import URL, getUrlPattern
+
+scriptsRegex: Pattern = compileRegex(r"<(script|style)\b.*?</\1\s*>", DOTALL)
+tagsRegex: Pattern = compileRegex(r"<[^>]*>")
+wordsRegex: Pattern = compileRegex(r"\w+")
+
+
+# Returns the words of the visible text of the HTML, lower-cased. Scripts, styles and tags are left out, so pages that
+#   only differ in markup (a CSRF token, a session key in every link) have the same words.
+def getPageWords(html: str) -> list[str]:
+    return wordsRegex.findall(tagsRegex.sub(" ", scriptsRegex.sub(" ", html)).lower())
+
+
+# Returns the 64 bits SimHash of the shingles (every shingleSize consecutive words) of the text: every bit is the
+#   majority vote of that bit in the hashes of the shingles. Similar texts get fingerprints a few bits apart.
+# blake2b is used instead of hash(), which changes between processes and would make fingerprints incomparable.
+def getSimHash(words: list[str], shingleSize: int = 4) -> int:
+    shingles: set[str] = {" ".join(words[i:i + shingleSize]) for i in range(max(1, len(words) - shingleSize + 1))}
+    digests: bytes = b"".join(blake2b(shingle.encode(), digest_size=8).digest() for shingle in shingles)
+    fingerprint: int = 0
+    # Counting the values of every byte of the digests lets Counter do the per-shingle work, the bits are then summed
+    #   from at most 256 values per byte.
+    for position in range(8):
+        byteCounts: Counter = Counter(digests[position::8])
+        for bit in range(8):
+            ones: int = sum(valueCount for value, valueCount in byteCounts.items() if value >> bit & 1)
+            if 2 * ones > len(shingles):
+                fingerprint |= 1 << (8 * position + bit)
+    return fingerprint
+
+
+# The fingerprint of a page, computed by the parse pool workers or by the crawler itself.
+def getPageFingerprint(html: str) -> int:
+    return getSimHash(getPageWords(html))
+
+
+def getHammingDistance(first: int, second: int) -> int:
+    return bin(first ^ second).count("1")
+
+
+# An index of fingerprints for finding one within maxDistance bits of a given fingerprint.
+# The 64 bits are split into maxDistance + 1 bands, and fingerprints that differ in at most maxDistance bits are
+#   identical in at least one of them. Only the fingerprints sharing a band with the searched one are compared, which
+#   are a tiny fraction of the index unless it holds billions.
+class SimHashIndex:
+    def __init__(self, maxDistance: int = 3):
+        self.maxDistance: int = maxDistance
+        self.bandSize: int = -(-64 // (maxDistance + 1))
+        self.bands: list[dict[int, list[tuple[int, str]]]] = [dict() for _ in range(maxDistance + 1)]
+
+    def __getBandKeys(self, fingerprint: int) -> list[int]:
+        mask: int = (1 << self.bandSize) - 1
+        return [fingerprint >> (band * self.bandSize) & mask for band in range(len(self.bands))]
+
+    def add(self, fingerprint: int, key: str) -> None:
+        for band, bandKey in zip(self.bands, self.__getBandKeys(fingerprint)):
+            band.setdefault(bandKey, []).append((fingerprint, key))
+
+    # Returns the key of a fingerprint within maxDistance bits, or None if there is none.
+    def find(self, fingerprint: int) -> Union[str, None]:
+        for band, bandKey in zip(self.bands, self.__getBandKeys(fingerprint)):
+            for candidate, key in band.get(bandKey, ()):
+                if getHammingDistance(fingerprint, candidate) <= self.maxDistance:
+                    return key
+        return None
+
+
+# Returns the URL pattern (see getUrlPattern) with the names of the query parameters, e.g.
+#   "moodle.tau.ac.il/calendar/*.php?time&view". Traps usually vary the values of the same parameters.
+def getDuplicatePattern(url: URL) -> str:
+    query: str = url.urlStr.split("#")[0].split("?", 1)[1] if "?" in url.urlStr else ""
+    parameters: list[str] = sorted({parameter.split("=")[0] for parameter in query.split("&") if parameter})
+    return f"{getUrlPattern(url)}?{'&'.join(parameters)}" if parameters else getUrlPattern(url)
+
+
+# Finds pages that are near-duplicates of pages seen before, and learns which URL patterns keep returning them, so a
+#   crawler can defer ("DEFER") or skip ("SKIP") the URLs of such patterns instead of spending its budget on them.
+class DuplicateFilter:
+    def __init__(self, maxDistance: int = 3, minSamples: int = 4, deferRatio: float = 0.5, skipRatio: float = 0.9):
+        self.index: SimHashIndex = SimHashIndex(maxDistance)
+        self.minSamples: int = minSamples
+        self.deferRatio: float = deferRatio
+        self.skipRatio: float = skipRatio
+        # {pattern: [pages, near-duplicate pages]}
+        self.patterns: dict[str, list[int]] = dict()
+
+    # Records the page and returns the URL of the page it is a near-duplicate of, or None if it is new.
+    def check(self, url: URL, fingerprint: int) -> Union[str, None]:
+        original: Union[str, None] = self.index.find(fingerprint)
+        if original is None:
+            self.index.add(fingerprint, str(url))
+        counts: list[int] = self.patterns.setdefault(getDuplicatePattern(url), [0, 0])
+        counts[0] += 1
+        counts[1] += original is not None
+        return original
+
+    # Returns "FETCH", "DEFER" (fetch only when there is nothing else to fetch) or "SKIP".
+    def getAction(self, url: URL) -> str:
+        pagesCount, duplicatesCount = self.patterns.get(getDuplicatePattern(url), (0, 0))
+        if pagesCount < self.minSamples:
+            return "FETCH"
+        if duplicatesCount >= self.skipRatio * pagesCount:
+            return "SKIP"
+        if duplicatesCount >= self.deferRatio * pagesCount:
+            return "DEFER"
+        return "FETCH"
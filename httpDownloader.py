@@ -0,0 +1,153 @@
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from time import monotonic, sleep
+from typing import Union, Callable
+import os
+from HttpConversation import HttpConversation, bColors, retryableErrors
+from httpUtils import URL, Connection, getUrlName, getRangeValidator, getBackoffDelay
+
+
+class Segment:
+    __slots__ = ("index", "start", "end", "written", "attempts")
+
+    def __init__(self, index: int, start: int, end: int):
+        self.index: int = index
+        self.start: int = start
+        self.end: int = end  # Inclusive, like in the Range header.
+        self.written: int = 0
+        self.attempts: int = 0
+
+    def __len__(self):
+        return self.end - self.start + 1
+
+    def isDone(self) -> bool:
+        return self.written == len(self)
+
+    def __repr__(self):
+        return f"{self.index}: {self.start}-{self.end} ({self.written}/{len(self)})"
+
+
+# Returns segmentsNum (or less, so no segment is smaller than minSegmentSize) consecutive segments covering fileSize.
+# An empty file has no segments.
+def splitToSegments(fileSize: int, segmentsNum: int, minSegmentSize: int = 1) -> list[Segment]:
+    if fileSize == 0:
+        return []
+    segmentsNum = max(1, min(segmentsNum, fileSize // max(1, minSegmentSize)))
+    segmentSize: int = -(-fileSize // segmentsNum)
+    return [Segment(i, start, min(fileSize, start + segmentSize) - 1)
+            for i, start in enumerate(range(0, fileSize, segmentSize))]
+
+
+# Prints the progress of every segment and the aggregate throughput, at most once every interval seconds.
+class ProgressReporter:
+    def __init__(self, interval: float = 1):
+        self.interval: float = interval
+        self.__lastReport: float = 0
+
+    def __call__(self, segments: list[Segment], elapsedTime: float, isFinal: bool = False) -> None:
+        if not isFinal and monotonic() - self.__lastReport < self.interval:
+            return
+        self.__lastReport = monotonic()
+        written: int = sum(segment.written for segment in segments)
+        total: int = sum(len(segment) for segment in segments)
+        segmentsStr: str = " ".join(f"{100 * segment.written // max(1, len(segment))}%" for segment in segments)
+        throughput: float = written / max(elapsedTime, 1e-9) / 2 ** 20
+        print(f"{bColors.OKCYAN}[{segmentsStr}] {written}/{total} bytes, {throughput:.2f} MiB/s{bColors.ENDC}")
+
+
+# Downloads a file over several connections at once, every one of them getting a different byte range of it.
+# The segments are written with positioned writes into a file preallocated to the final size, a failed segment is
+#   retried from where it stopped without touching the others.
+# Servers that don't answer the probe with "Accept-Ranges: bytes" and a Content-Length get a regular download.
+class SegmentedDownloader:
+    def __init__(self, conversation: HttpConversation, segmentsNum: int = 4, maxRetries: int = 5,
+                 bufferSize: int = 65536, minSegmentSize: int = 2 ** 20,
+                 onProgress: Callable[[list[Segment], float, bool], None] = None):
+        # The probe and fallback downloads go through this conversation, the segments through copies of it.
+        self.conversation: HttpConversation = conversation
+        self.segmentsNum: int = segmentsNum
+        self.maxRetries: int = maxRetries
+        self.bufferSize: int = bufferSize
+        self.minSegmentSize: int = minSegmentSize
+        self.onProgress: Callable[[list[Segment], float, bool], None] = \
+            ProgressReporter() if onProgress is None else onProgress
+
+    # Returns a connection of the pool. They share the cookies of the conversation but not its socket.
+    def __newConversation(self) -> HttpConversation:
+        conversation: HttpConversation = HttpConversation(
+            port=self.conversation.port, packetRecvTimeOut=self.conversation.packetRecvTimeOut, log=False,
+            recvSize=self.conversation.receiveSize, isSecure=self.conversation.isSecure,
+            requestTimeOut=self.conversation.requestTimeOut, retryBackoff=self.conversation.retryBackoff,
+            maxBackoff=self.conversation.maxBackoff, historyPolicy="last", historySize=1,
+            sslContext=self.conversation.sslContext, captureArchive=self.conversation.captureArchive)
+        conversation.cookieJar = self.conversation.cookieJar
+        return conversation
+
+    def download(self, url: Union[str, URL], targetPath: str) -> int:
+        if isinstance(url, str):
+            url: URL = URL(url)
+        self.conversation.converse(Connection(url, "HEAD", getUrlName(url), headers={"Accept-Encoding": "identity"}))
+        # The probe followed the redirects, the segments go straight to the final URL.
+        url = self.conversation.currConnection.url
+        headers: dict[str, str] = self.conversation.currConnection.response.headers
+        # An empty file has no range to ask for, so it's downloaded like a file without ranges.
+        if headers.get("accept-ranges", "").lower() != "bytes" or not headers.get("content-length", "").isdigit() or \
+                int(headers["content-length"]) == 0:
+            return self.conversation.download(url, targetPath, self.bufferSize)
+        fileSize: int = int(headers["content-length"])
+        validator: str = getRangeValidator(self.conversation.currConnection.response)
+        segments: list[Segment] = splitToSegments(fileSize, self.segmentsNum, self.minSegmentSize)
+        partPath: str = f"{targetPath}.part"
+        # 0o666 (before the umask) like open() uses, os.open defaults to 0o777 which makes the file executable.
+        fileDescriptor: int = os.open(partPath, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o666)
+        conversations: Queue[HttpConversation] = Queue()
+        try:
+            os.ftruncate(fileDescriptor, fileSize)
+            # Reserving the blocks up front keeps the file from fragmenting while the segments fill it.
+            if hasattr(os, "posix_fallocate"):
+                try:
+                    os.posix_fallocate(fileDescriptor, 0, fileSize)
+                except OSError:
+                    pass
+            for _ in segments:
+                conversations.put(self.__newConversation())
+            startTime: float = monotonic()
+            with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+                futures = [executor.submit(self.__downloadSegment, conversations, url, fileDescriptor, segment,
+                                           validator, segments, startTime) for segment in segments]
+                for future in futures:
+                    future.result()
+            self.onProgress(segments, monotonic() - startTime, True)
+        finally:
+            while not conversations.empty():
+                conversations.get().close()
+            os.close(fileDescriptor)
+        if not all(segment.isDone() for segment in segments) or os.path.getsize(partPath) != fileSize:
+            raise ConnectionError(f"Download of {url} is incomplete")
+        os.replace(partPath, targetPath)
+        return fileSize
+
+    def __downloadSegment(self, conversations: Queue, url: URL, fileDescriptor: int, segment: Segment,
+                          validator: str, segments: list[Segment], startTime: float) -> None:
+        conversation: HttpConversation = conversations.get()
+
+        def onWrite(written: int) -> None:
+            segment.written += written
+            self.onProgress(segments, monotonic() - startTime, False)
+
+        try:
+            while not segment.isDone():
+                try:
+                    conversation.downloadRange(url, fileDescriptor, segment.start + segment.written, segment.end,
+                                               validator, self.bufferSize, onWrite)
+                except retryableErrors as e:
+                    segment.attempts += 1
+                    if segment.attempts >= self.maxRetries:
+                        raise ConnectionError(f"Segment {segment} of {url} failed {segment.attempts} times") from e
+                    backoffDelay: float = getBackoffDelay(segment.attempts, conversation.retryBackoff,
+                                                          conversation.maxBackoff)
+                    print(f"{bColors.WARNING}Segment {segment} failed ({type(e).__name__}: {e}), "
+                          f"retrying in {backoffDelay:.2f}s.{bColors.ENDC}")
+                    sleep(backoffDelay)
+        finally:
+            conversations.put(conversation)
@@ -0,0 +1,180 @@
+from socket import socket
+from time import monotonic
+from typing import Union
+from httpUtils import Request, getRequestPath, isHtmlContentType
+
+# HTTP/2 needs the h2 package (pip install h2). Without it conversations only speak HTTP/1.1.
+try:
+    from h2.config import H2Configuration
+    from h2.connection import H2Connection
+    from h2.errors import ErrorCodes
+    from h2.events import ResponseReceived, DataReceived, StreamEnded, StreamReset, WindowUpdated, \
+        ConnectionTerminated, RemoteSettingsChanged
+    from h2.exceptions import ProtocolError, StreamClosedError
+    isH2Available: bool = True
+except ImportError:
+    isH2Available: bool = False
+
+# Offered in the TLS handshake (ALPN), in order of preference.
+alpnProtocols: list[str] = ["h2", "http/1.1"]
+# Headers of HTTP/1.1 connections that HTTP/2 forbids (RFC 9113 section 8.2.2). The host goes in ":authority".
+connectionHeaders: set[str] = {"connection", "keep-alive", "proxy-connection", "transfer-encoding", "upgrade", "host"}
+# The connection flow-control window is raised to this, so big responses aren't held back by the default 64KB.
+connectionWindowSize: int = 2 ** 24
+
+
+def getH2Headers(request: Request, scheme: str) -> list[tuple[str, str]]:
+    headers: list[tuple[str, str]] = [(":method", request.type), (":authority", request.url.domain),
+                                      (":scheme", scheme), (":path", getRequestPath(request.url))]
+    headers.extend((name.lower(), str(value)) for name, value in request.headers.items()
+                   if name.lower() not in connectionHeaders)
+    return headers
+
+
+# Builds the response as an HTTP/1.1 response would look like, so it is parsed, logged and stored the same way.
+def getResponseBytes(headers: list[tuple[bytes, bytes]], body: bytes) -> bytes:
+    headLines: list[bytes] = []
+    status: bytes = b""
+    for name, value in headers:
+        if name == b":status":
+            status = value
+        elif not name.startswith(b":"):
+            headLines.append(name + b": " + value + b"\r\n")
+    return b"HTTP/2 " + status + b"\r\n" + b"".join(headLines) + b"\r\n" + body
+
+
+class H2Stream:
+    __slots__ = ("request", "htmlOnly", "streamId", "headers", "body", "pendingBody", "isDone", "isBodySkipped",
+                 "error")
+
+    def __init__(self, request: Request, htmlOnly: bool):
+        self.request: Request = request
+        self.htmlOnly: bool = htmlOnly
+        self.streamId: int = -1
+        self.headers: list[tuple[bytes, bytes]] = []
+        self.body: list[bytes] = []
+        self.pendingBody: bytes = b""  # The part of the request body the flow-control window didn't allow yet.
+        self.isDone: bool = False
+        self.isBodySkipped: bool = False
+        self.error: Union[Exception, None] = None
+
+
+# An HTTP/2 connection over a socket that negotiated "h2". Requests are sent as concurrent streams, as many as the
+#   server allows, and their responses are read as they are interleaved on the connection.
+class H2Transport:
+    def __init__(self, clientSocket: socket, scheme: str = "https", recvSize: int = 65536):
+        self.socket: socket = clientSocket
+        self.scheme: str = scheme
+        self.recvSize: int = recvSize
+        self.isClosed: bool = False  # Set once the server sent GOAWAY or closed the socket.
+        self.h2: H2Connection = H2Connection(H2Configuration(client_side=True, header_encoding=None))
+        self.h2.initiate_connection()
+        self.h2.increment_flow_control_window(connectionWindowSize - self.h2.inbound_flow_control_window)
+        self.socket.sendall(self.h2.data_to_send())
+
+    # Sends all the requests and waits for all of their responses, or until the deadline (a monotonic() time).
+    # Returns for every request either (response bytes, whether the body was skipped) or the error that ended its
+    #   stream. Like in HttpConversation, the body of a non-HTML response to an htmlOnly request is skipped, which
+    #   only costs resetting its stream instead of the whole connection.
+    def exchange(self, requests: list[tuple[Request, bool]], deadline: float) -> list[Union[tuple[bytes, bool],
+                                                                                           Exception]]:
+        streams: list[H2Stream] = [H2Stream(request, htmlOnly) for request, htmlOnly in requests]
+        activeStreams: dict[int, H2Stream] = dict()
+        nextStream: int = 0  # The index of the first stream that wasn't opened yet.
+        try:
+            while not all(stream.isDone for stream in streams):
+                while nextStream < len(streams) and not self.isClosed and \
+                        self.h2.open_outbound_streams < self.h2.remote_settings.max_concurrent_streams:
+                    self.__openStream(streams[nextStream], activeStreams)
+                    nextStream += 1
+                self.socket.sendall(self.h2.data_to_send())
+                if self.isClosed:
+                    for stream in streams:
+                        if not stream.isDone:
+                            stream.error = ConnectionError("The server closed the HTTP/2 connection")
+                            stream.isDone = True
+                    break
+                remainingTime: float = deadline - monotonic()
+                if remainingTime <= 0:
+                    raise TimeoutError("Request deadline exceeded")
+                self.socket.settimeout(remainingTime)
+                data: bytes = self.socket.recv(self.recvSize)
+                if not data:
+                    self.isClosed = True
+                    continue
+                for event in self.h2.receive_data(data):
+                    self.__handleEvent(event, activeStreams)
+            self.socket.sendall(self.h2.data_to_send())
+        except ProtocolError as e:
+            self.isClosed = True
+            raise ConnectionError(f"HTTP/2 protocol error: {e}") from e
+        except (TimeoutError, OSError):
+            # The stream states are unknown after a failed read, so the connection isn't used again.
+            self.isClosed = True
+            raise
+        return [stream.error if stream.error is not None else
+                (getResponseBytes(stream.headers, b"".join(stream.body)), stream.isBodySkipped) for stream in streams]
+
+    def __openStream(self, stream: H2Stream, activeStreams: dict[int, H2Stream]) -> None:
+        stream.streamId = self.h2.get_next_available_stream_id()
+        activeStreams[stream.streamId] = stream
+        stream.pendingBody = stream.request.content.encode() if stream.request.content else b""
+        self.h2.send_headers(stream.streamId, getH2Headers(stream.request, self.scheme),
+                             end_stream=not stream.pendingBody)
+        self.__sendPendingBody(stream)
+
+    # Sends as much of the request body as the flow-control windows allow, the rest waits for a WINDOW_UPDATE.
+    def __sendPendingBody(self, stream: H2Stream) -> None:
+        while stream.pendingBody:
+            size: int = min(len(stream.pendingBody), self.h2.local_flow_control_window(stream.streamId),
+                            self.h2.max_outbound_frame_size)
+            if size <= 0:
+                return
+            self.h2.send_data(stream.streamId, stream.pendingBody[:size], end_stream=size == len(stream.pendingBody))
+            stream.pendingBody = stream.pendingBody[size:]
+
+    def __handleEvent(self, event, activeStreams: dict[int, H2Stream]) -> None:
+        if isinstance(event, (ConnectionTerminated, RemoteSettingsChanged, WindowUpdated)):
+            if isinstance(event, ConnectionTerminated):
+                self.isClosed = True
+            for stream in activeStreams.values():
+                if stream.pendingBody and not stream.isDone:
+                    self.__sendPendingBody(stream)
+            return
+        if isinstance(event, DataReceived):
+            # Data is acknowledged even when it's thrown away, otherwise the connection window runs out.
+            try:
+                self.h2.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+            except StreamClosedError:
+                pass
+        stream: Union[H2Stream, None] = activeStreams.get(getattr(event, "stream_id", None))
+        if stream is None:
+            return
+        if isinstance(event, ResponseReceived):
+            stream.headers = event.headers
+            contentType: bytes = next((value for name, value in event.headers if name == b"content-type"), b"")
+            if stream.htmlOnly and not isHtmlContentType(contentType.decode("ISO-8859-1")):
+                stream.isBodySkipped = True
+                stream.isDone = True
+                if not event.stream_ended:
+                    self.h2.reset_stream(event.stream_id, ErrorCodes.CANCEL)
+        elif isinstance(event, DataReceived):
+            if not stream.isBodySkipped:
+                stream.body.append(event.data)
+        elif isinstance(event, StreamEnded):
+            stream.isDone = True
+        elif isinstance(event, StreamReset):
+            if not stream.isDone:
+                stream.error = ConnectionError(f"Stream {event.stream_id} was reset ({event.error_code!r})")
+                stream.isDone = True
+        if stream.isDone:
+            activeStreams.pop(stream.streamId, None)
+
+    def close(self) -> None:
+        if not self.isClosed:
+            try:
+                self.h2.close_connection()
+                self.socket.sendall(self.h2.data_to_send())
+            except OSError:
+                pass
+        self.isClosed = True
@@ -0,0 +1,113 @@
+from collections import deque
+from tempfile import TemporaryFile
+from threading import Lock
+from typing import Union, Iterator, BinaryIO
+from httpUtils import Connection
+
+historyPolicies: set[str] = {"all", "last", "metadata", "spill"}
+
+
+# An append-only file of response bodies. Bodies are only ever added at the end, and are read back by their offset.
+class BodyStore:
+    def __init__(self, filePath: str = None):
+        # Without a path the store is an anonymous temporary file, deleted when closed.
+        self.file: BinaryIO = TemporaryFile() if filePath is None else open(filePath, "w+b")
+        self.size: int = 0
+        self.__lock: Lock = Lock()
+
+    def append(self, body: str) -> "SpilledBody":
+        # Bodies are decoded as ISO-8859-1 by parseResponse, so encoding them back gives the exact received bytes.
+        bodyBytes: bytes = body.encode("ISO-8859-1")
+        with self.__lock:
+            self.file.seek(self.size)
+            self.file.write(bodyBytes)
+            offset: int = self.size
+            self.size += len(bodyBytes)
+        return SpilledBody(self, offset, len(bodyBytes))
+
+    def read(self, offset: int, length: int) -> str:
+        with self.__lock:
+            self.file.seek(offset)
+            return self.file.read(length).decode("ISO-8859-1")
+
+    def close(self) -> None:
+        self.file.close()
+
+
+# Stands in for the body of a Response once it was written to a BodyStore, and reads it back on every access.
+class SpilledBody:
+    __slots__ = ("store", "offset", "length")
+
+    def __init__(self, store: BodyStore, offset: int, length: int):
+        self.store: BodyStore = store
+        self.offset: int = offset
+        self.length: int = length
+
+    def load(self) -> str:
+        return self.store.read(self.offset, self.length)
+
+
+# The connections of a conversation, indexed like a list from the first connection ever made, of which only the
+#   last `size` are kept whole. What happens to older connections depends on the policy:
+#   "all" - nothing, everything is kept in memory (the size is ignored).
+#   "last" - they are dropped, accessing them raises an IndexError.
+#   "metadata" - the request and the response headers are kept, the response body is dropped.
+#   "spill" - the response body is moved to a BodyStore and read back from it when accessed.
+class ConnectionHistory:
+    def __init__(self, policy: str = "all", size: int = 100, spillPath: str = None):
+        if policy not in historyPolicies:
+            raise ValueError(f"Unknown history policy <{policy}>")
+        self.policy: str = policy
+        self.size: int = max(1, size)
+        self.store: Union[BodyStore, None] = BodyStore(spillPath) if policy == "spill" else None
+        # The kept connections, the first of them is connection number droppedNum. Only "last" drops connections,
+        #   so its memory stays the same however many connections are made.
+        self.__connections: deque[Connection] = deque()
+        self.__droppedNum: int = 0
+        self.__evictedNum: int = 0  # The connections before this index are no longer whole.
+
+    def append(self, connection: Connection) -> None:
+        self.__connections.append(connection)
+        if self.policy == "last":
+            while len(self.__connections) > self.size:
+                self.__connections.popleft()
+                self.__droppedNum += 1
+        elif self.policy != "all":
+            while len(self) - self.__evictedNum > self.size:
+                self.__evict(self.__connections[self.__evictedNum])
+                self.__evictedNum += 1
+
+    def __evict(self, connection: Connection) -> None:
+        if connection.response is not None and connection.response.body:
+            if self.policy == "metadata":
+                connection.response.body = ""
+            else:
+                connection.response.body = self.store.append(connection.response.body)
+
+    def __getConnection(self, index: int) -> Connection:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Connection {index} is out of the history")
+        if index < self.__droppedNum:
+            raise IndexError(f"Connection {index} was dropped from the history")
+        return self.__connections[index - self.__droppedNum]
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Connection, list[Connection]]:
+        if isinstance(index, slice):
+            return [self.__getConnection(i) for i in range(*index.indices(len(self)))]
+        return self.__getConnection(index)
+
+    def __len__(self):
+        return self.__droppedNum + len(self.__connections)
+
+    def __bool__(self):
+        return bool(self.__connections)
+
+    # Iterates over the connections that weren't dropped.
+    def __iter__(self) -> Iterator[Connection]:
+        return iter(self.__connections)
+
+    def close(self) -> None:
+        if self.store is not None:
+            self.store.close()
@@ -0,0 +1,190 @@
+from array import array
+from collections import deque
+from csv import writer
+from struct import pack, unpack, calcsize
+from sys import byteorder
+from typing import Iterable, Union
+from httpUtils import URL
+
+binaryMagic = b"LGRAPH1\n"
+binaryHeaderFormat = "<QQ"  # Nodes and edges count.
+
+
+# Returns the string identifying a URL in the graph. It is made of the same fields URL.__eq__ compares, so equal URLs
+#   are the same node whatever their scheme or fragment.
+def getNodeKey(url: URL) -> str:
+    return f"{url.domain}{url.getPortStr()}{url.path}"
+
+
+# The arrays are written little-endian whatever the machine is, so the files can be moved between machines.
+def writeArray(f, values: array) -> None:
+    if byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    values.tofile(f)
+
+
+def readArray(f, typecode: str, length: int) -> array:
+    values: array = array(typecode)
+    values.fromfile(f, length)
+    if byteorder == "big":
+        values.byteswap()
+    return values
+
+
+# The link graph found by a crawl. URLs are interned to consecutive integer IDs and everything else is kept in typed
+#   arrays indexed by them, so a graph of millions of edges takes tens of megabytes.
+# Edges are appended as (source, target) pairs while crawling and turned into a compressed sparse row (CSR) adjacency
+#   when queried: the targets of node i are targets[offsets[i]:offsets[i + 1]].
+class LinkGraph:
+    def __init__(self):
+        self.urls: list[str] = []
+        self.ids: dict[str, int] = dict()
+        self.status: array = array("H")  # HTTP status code, 0 if the page wasn't fetched.
+        self.depth: array = array("i")  # Click depth from the crawl start, -1 if unknown.
+        self.size: array = array("q")  # Body size in bytes, -1 if unknown.
+        self.__edgeSources: array = array("I")
+        self.__edgeTargets: array = array("I")
+        self.__offsets: Union[array, None] = None
+        self.__targets: Union[array, None] = None
+
+    def __len__(self):
+        return len(self.urls)
+
+    def getEdgesNum(self) -> int:
+        return len(self.__edgeSources)
+
+    def addNode(self, url: URL, depth: int = -1) -> int:
+        key: str = getNodeKey(url)
+        nodeId: Union[int, None] = self.ids.get(key)
+        if nodeId is None:
+            nodeId = len(self.urls)
+            self.ids[key] = nodeId
+            # str(url) drops the port, which is part of the key and has to survive saving and loading the graph.
+            self.urls.append(f"{url.getSchemeStr()}{key}")
+            self.status.append(0)
+            self.depth.append(depth)
+            self.size.append(-1)
+        elif depth != -1 and (self.depth[nodeId] == -1 or depth < self.depth[nodeId]):
+            self.depth[nodeId] = depth
+        return nodeId
+
+    def getNodeId(self, url: URL) -> Union[int, None]:
+        return self.ids.get(getNodeKey(url))
+
+    def setNodeInfo(self, nodeId: int, status: int, size: int) -> None:
+        self.status[nodeId] = status
+        self.size[nodeId] = size
+
+    # Adds an edge from the source to every target, links repeated in the same page are added once.
+    def addEdges(self, sourceId: int, targetIds: Iterable[int]) -> None:
+        for targetId in dict.fromkeys(targetIds):
+            self.__edgeSources.append(sourceId)
+            self.__edgeTargets.append(targetId)
+        self.__offsets = None
+
+    # Builds the CSR arrays with a counting sort of the edges by their source, in O(nodes + edges).
+    def getAdjacency(self) -> tuple[array, array]:
+        if self.__offsets is None:
+            offsets: array = array("I", bytes(4 * (len(self.urls) + 1)))
+            for source in self.__edgeSources:
+                offsets[source + 1] += 1
+            for i in range(len(self.urls)):
+                offsets[i + 1] += offsets[i]
+            positions: array = array("I", offsets[:-1])
+            targets: array = array("I", bytes(4 * len(self.__edgeTargets)))
+            for source, target in zip(self.__edgeSources, self.__edgeTargets):
+                targets[positions[source]] = target
+                positions[source] += 1
+            self.__offsets, self.__targets = offsets, targets
+        return self.__offsets, self.__targets
+
+    def getLinks(self, nodeId: int) -> array:
+        offsets, targets = self.getAdjacency()
+        return targets[offsets[nodeId]:offsets[nodeId + 1]]
+
+    def getInDegrees(self) -> array:
+        inDegrees: array = array("I", bytes(4 * len(self.urls)))
+        for target in self.__edgeTargets:
+            inDegrees[target] += 1
+        return inDegrees
+
+    # Returns the fetched pages no other page links to, except for the given roots (the crawl start and seeds).
+    def getOrphans(self, rootIds: Iterable[int] = ()) -> list[int]:
+        roots: set[int] = set(rootIds)
+        inDegrees: array = self.getInDegrees()
+        return [nodeId for nodeId in range(len(self.urls))
+                if inDegrees[nodeId] == 0 and self.status[nodeId] != 0 and nodeId not in roots]
+
+    # Returns the smallest number of clicks from the root to every node (-1 for unreachable nodes), with a BFS.
+    def getClickDepths(self, rootId: int = 0) -> array:
+        offsets, targets = self.getAdjacency()
+        depths: array = array("i", [-1]) * len(self.urls)
+        depths[rootId] = 0
+        queue: deque[int] = deque([rootId])
+        while queue:
+            nodeId: int = queue.popleft()
+            for target in targets[offsets[nodeId]:offsets[nodeId + 1]]:
+                if depths[target] == -1:
+                    depths[target] = depths[nodeId] + 1
+                    queue.append(target)
+        return depths
+
+    def saveBinary(self, filePath: str) -> None:
+        offsets, targets = self.getAdjacency()
+        with open(filePath, "wb") as f:
+            f.write(binaryMagic)
+            f.write(pack(binaryHeaderFormat, len(self.urls), len(targets)))
+            for values in (self.status, self.depth, self.size, offsets, targets):
+                writeArray(f, values)
+            f.write("\n".join(self.urls).encode("utf-8"))
+
+    @classmethod
+    def loadBinary(cls, filePath: str) -> "LinkGraph":
+        graph: LinkGraph = cls()
+        with open(filePath, "rb") as f:
+            if f.read(len(binaryMagic)) != binaryMagic:
+                raise ValueError(f"{filePath} isn't a link graph file")
+            nodesNum, edgesNum = unpack(binaryHeaderFormat, f.read(calcsize(binaryHeaderFormat)))
+            graph.status = readArray(f, "H", nodesNum)
+            graph.depth = readArray(f, "i", nodesNum)
+            graph.size = readArray(f, "q", nodesNum)
+            offsets: array = readArray(f, "I", nodesNum + 1)
+            targets: array = readArray(f, "I", edgesNum)
+            urlsStr: str = f.read().decode("utf-8")
+        graph.urls = urlsStr.split("\n") if nodesNum else []
+        graph.ids = {getNodeKey(URL(url)): nodeId for nodeId, url in enumerate(graph.urls)}
+        for nodeId in range(nodesNum):
+            graph.__edgeSources.extend(array("I", [nodeId]) * (offsets[nodeId + 1] - offsets[nodeId]))
+        graph.__edgeTargets = targets
+        graph.__offsets, graph.__targets = offsets, targets
+        return graph
+
+    def exportCsv(self, nodesPath: str, edgesPath: str) -> None:
+        with open(nodesPath, "w", encoding="utf-8", newline="") as f:
+            nodesWriter = writer(f)
+            nodesWriter.writerow(("id", "url", "status", "depth", "size"))
+            nodesWriter.writerows(zip(range(len(self.urls)), self.urls, self.status, self.depth, self.size))
+        with open(edgesPath, "w", encoding="utf-8", newline="") as f:
+            edgesWriter = writer(f)
+            edgesWriter.writerow(("source", "target"))
+            edgesWriter.writerows(zip(self.__edgeSources, self.__edgeTargets))
+
+    def exportGraphML(self, filePath: str) -> None:
+        # Imported here since xml.sax pulls in urllib.request, which would slow down importing the crawler.
+        from xml.sax.saxutils import escape
+        with open(filePath, "w", encoding="utf-8") as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                    '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+                    '  <key id="url" for="node" attr.name="url" attr.type="string"/>\n'
+                    '  <key id="status" for="node" attr.name="status" attr.type="int"/>\n'
+                    '  <key id="depth" for="node" attr.name="depth" attr.type="int"/>\n'
+                    '  <key id="size" for="node" attr.name="size" attr.type="long"/>\n'
+                    '  <graph id="links" edgedefault="directed">\n')
+            for nodeId, url in enumerate(self.urls):
+                f.write(f'    <node id="n{nodeId}"><data key="url">{escape(url)}</data>'
+                        f'<data key="status">{self.status[nodeId]}</data><data key="depth">{self.depth[nodeId]}</data>'
+                        f'<data key="size">{self.size[nodeId]}</data></node>\n')
+            for source, target in zip(self.__edgeSources, self.__edgeTargets):
+                f.write(f'    <edge source="n{source}" target="n{target}"/>\n')
+            f.write("  </graph>\n</graphml>\n")
@@ -0,0 +1,47 @@
+from concurrent.futures import Future
+from hashlib import sha1
+from typing import NamedTuple
+from httpUtils import URL, parseResponse, getLinksFromHTML
+from httpDedup import getPageFingerprint
+
+
+# The compact result of parsing a response in a worker process.
+# Only plain strings cross the process boundary, the main process rebuilds URL and Cookie objects it needs.
+class ParsedPage(NamedTuple):
+    statusCode: str
+    headers: dict[str, str]
+    cookies: list[str]
+    links: list[str]
+    digest: str
+    bodySize: int
+    fingerprint: int  # SimHash of the text, see httpDedup.
+
+
+# Runs in the worker processes, so it has to stay a module level function (picklable with the spawn start method).
+def parsePage(responseBytes: bytes, urlStr: str) -> ParsedPage:
+    response = parseResponse(responseBytes, URL(urlStr))
+    links: list[str] = [link.urlStr for link in getLinksFromHTML(response.body)]
+    bodyBytes: bytes = response.body.encode("ISO-8859-1")
+    return ParsedPage(response.statusCode, response.headers, [cookie.fullCookieStr() for cookie in response.cookies],
+                      links, sha1(bodyBytes).hexdigest(), len(bodyBytes), getPageFingerprint(response.body))
+
+
+# Decompresses, decodes and extracts the links of responses in a pool of processes, so parsing isn't limited by the
+#   GIL of the process that owns the sockets and the cookie jar.
+class ParsePool:
+    def __init__(self, workers: int = None):
+        # Imported here, it pulls in multiprocessing, which conversations without a parse pool don't need.
+        from concurrent.futures import ProcessPoolExecutor
+        self.executor: ProcessPoolExecutor = ProcessPoolExecutor(max_workers=workers)
+
+    def submit(self, responseBytes: bytes, url: URL) -> Future:
+        return self.executor.submit(parsePage, responseBytes, url.urlStr)
+
+    def close(self) -> None:
+        self.executor.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
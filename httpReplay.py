@@ -0,0 +1,120 @@
+import json
+import os
+from hashlib import blake2b
+from mmap import mmap, ACCESS_READ
+from threading import Lock
+from typing import Union, BinaryIO, TextIO
+from httpUtils import URL, Request, getRequestPath
+
+
+# Returns the URL in a form that doesn't depend on how it was written: no scheme or fragment, a lower-case domain and
+#   the query parameters sorted.
+def getCanonicalUrl(url: URL) -> str:
+    path, _, query = getRequestPath(url).partition("?")
+    parameters: str = "&".join(sorted(parameter for parameter in query.split("&") if parameter))
+    return f"{url.domain.lower()}{url.getPortStr()}{path}{'?' if parameters else ''}{parameters}"
+
+
+class CaptureRecord:
+    __slots__ = ("offset", "length", "isBodySkipped", "elapsed")
+
+    def __init__(self, offset: int, length: int, isBodySkipped: bool, elapsed: float):
+        self.offset: int = offset
+        self.length: int = length
+        self.isBodySkipped: bool = isBodySkipped
+        self.elapsed: float = elapsed  # The seconds the response took when it was recorded.
+
+
+# The responses of recorded conversations, for playing them back without a network (see captureArchive in
+#   HttpConversation). An archive is two files: "{path}.data" with the raw responses one after the other, and
+#   "{path}.index" with a JSON line per response: its key (see getKey), where it is in the data file and how long it
+#   took. Both are only ever appended to, so recording costs a write per response and can go on in a later run.
+# A request that was recorded more than once gets the recorded responses in order, and the last one after them.
+# The conversations of several threads (see mapDomain) may share an archive.
+class CaptureArchive:
+    def __init__(self, path: str, isRecording: bool = False, matchBody: bool = False):
+        self.path: str = path
+        self.isRecording: bool = isRecording
+        # Whether the hash of the request body is part of the key. Off by default, since bodies like login forms
+        #   carry tokens that change between runs.
+        self.matchBody: bool = matchBody
+        self.records: dict[str, list[CaptureRecord]] = dict()
+        self.__replayCounts: dict[str, int] = dict()
+        self.__dataFile: Union[BinaryIO, None] = None
+        self.__indexFile: Union[TextIO, None] = None
+        self.__data: Union[mmap, None] = None
+        self.__dataSize: int = 0
+        self.__lock: Lock = Lock()
+        if os.path.exists(f"{path}.index"):
+            self.__loadIndex()
+        elif not isRecording:
+            raise FileNotFoundError(f"No capture archive at {path}")
+        if isRecording:
+            self.__dataFile = open(f"{path}.data", "ab")
+            self.__indexFile = open(f"{path}.index", "a", encoding="utf-8")
+            self.__dataSize = self.__dataFile.tell()
+        elif os.path.getsize(f"{path}.data") > 0:
+            # The responses are read from the page cache, without copying the whole file into memory.
+            with open(f"{path}.data", "rb") as f:
+                self.__data = mmap(f.fileno(), 0, access=ACCESS_READ)
+
+    def __loadIndex(self) -> None:
+        with open(f"{self.path}.index", "r", encoding="utf-8") as f:
+            for line in f:
+                # A line cut by a crash ends the index, the responses before it are still good.
+                try:
+                    entry: dict = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                self.records.setdefault(entry["key"], []).append(
+                    CaptureRecord(entry["offset"], entry["length"], entry["isBodySkipped"], entry["elapsed"]))
+
+    # Range requests get the range in their key, since the same URL answers them differently.
+    def getKey(self, request: Request) -> str:
+        key: str = f"{request.type.upper()} {getCanonicalUrl(request.url)}"
+        if "Range" in request.headers:
+            key += f" {request.headers['Range']}"
+        if self.matchBody and request.content:
+            key += f" {blake2b(request.content.encode(), digest_size=16).hexdigest()}"
+        return key
+
+    def record(self, request: Request, data: bytes, isBodySkipped: bool, elapsed: float) -> None:
+        key: str = self.getKey(request)
+        with self.__lock:
+            captureRecord: CaptureRecord = CaptureRecord(self.__dataSize, len(data), isBodySkipped, elapsed)
+            self.__dataFile.write(data)
+            self.__dataSize += len(data)
+            # The data is flushed first, so an index line never points past the end of the data file.
+            self.__dataFile.flush()
+            self.__indexFile.write(json.dumps({"key": key, "offset": captureRecord.offset,
+                                               "length": captureRecord.length, "isBodySkipped": isBodySkipped,
+                                               "elapsed": round(elapsed, 6)}) + "\n")
+            self.__indexFile.flush()
+            self.records.setdefault(key, []).append(captureRecord)
+
+    # Returns the next recorded response to the request and whether its body was skipped, or None if there is none.
+    def replay(self, request: Request) -> Union[tuple[bytes, bool], None]:
+        key: str = self.getKey(request)
+        records: Union[list[CaptureRecord], None] = self.records.get(key)
+        if not records:
+            return None
+        with self.__lock:
+            replayCount: int = self.__replayCounts.get(key, 0)
+            self.__replayCounts[key] = replayCount + 1
+        captureRecord: CaptureRecord = records[min(replayCount, len(records) - 1)]
+        if self.__data is None:
+            return b"", captureRecord.isBodySkipped
+        return self.__data[captureRecord.offset:captureRecord.offset + captureRecord.length], \
+            captureRecord.isBodySkipped
+
+    def close(self) -> None:
+        for f in (self.__dataFile, self.__indexFile, self.__data):
+            if f is not None:
+                f.close()
+        self.__dataFile = self.__indexFile = self.__data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,132 @@
+from gzip import GzipFile
+from re import compile as compileRegex, escape, Pattern
+from typing import Iterable, Iterator, NamedTuple, Union
+from xml.etree.ElementTree import iterparse, ParseError
+from httpUtils import URL, getRequestPath
+
+# The product token matched against the User-agent lines of robots.txt (see the User-Agent header in httpUtils).
+robotsUserAgent = "Mozilla"
+
+
+class RobotsRule(NamedTuple):
+    pattern: Pattern
+    length: int
+    isAllowed: bool
+
+
+def compileRobotsPattern(path: str) -> Pattern:
+    # '*' matches any sequence of characters and a '$' at the end anchors the pattern to the end of the path.
+    isAnchored: bool = path.endswith("$")
+    regex: str = ".*".join(escape(part) for part in path.removesuffix("$").split("*"))
+    return compileRegex(regex + ("$" if isAnchored else ""))
+
+
+# The rules of robots.txt for one user agent (see https://www.rfc-editor.org/rfc/rfc9309).
+class RobotsRules:
+    def __init__(self):
+        self.rules: list[RobotsRule] = []
+        self.crawlDelay: Union[float, None] = None
+        self.sitemaps: list[str] = []
+
+    def addRule(self, path: str, isAllowed: bool) -> None:
+        if path:  # An empty Disallow allows everything.
+            self.rules.append(RobotsRule(compileRobotsPattern(path), len(path), isAllowed))
+
+    # The longest matching rule decides, Allow wins a tie. URLs that no rule matches are allowed.
+    def isAllowed(self, url: URL) -> bool:
+        path: str = getRequestPath(url)
+        if path == "/robots.txt":
+            return True
+        bestRule: Union[RobotsRule, None] = None
+        for rule in self.rules:
+            if rule.pattern.match(path) and (bestRule is None or rule.length > bestRule.length or
+                                             (rule.length == bestRule.length and rule.isAllowed)):
+                bestRule = rule
+        return bestRule is None or bestRule.isAllowed
+
+
+# Returns the product token of a User-agent value, lower-cased: "Googlebot/2.1" -> "googlebot".
+def getProductToken(userAgent: str) -> str:
+    return userAgent.split("/")[0].strip().lower()
+
+
+# Parses robots.txt line by line and returns the rules of the group of userAgent, or of the '*' group if there is no
+#   such group. Groups are matched by their whole product token, so "User-agent: m" isn't a group of "Mozilla".
+# Sitemap lines apply to every user agent.
+def parseRobots(lines: Iterable[str], userAgent: str = robotsUserAgent) -> RobotsRules:
+    userAgent = getProductToken(userAgent)
+    agentRules: RobotsRules = RobotsRules()
+    defaultRules: RobotsRules = RobotsRules()
+    hasAgentGroup: bool = False
+    groupAgents: list[str] = []
+    isGroupStart: bool = True  # Consecutive User-agent lines belong to the same group.
+    for line in lines:
+        line = line.split("#")[0].strip()
+        if ":" not in line:
+            continue
+        field, value = line.split(":", 1)
+        field, value = field.strip().lower(), value.strip()
+        if field == "sitemap":
+            agentRules.sitemaps.append(value)
+            defaultRules.sitemaps.append(value)
+        elif field == "user-agent":
+            if not isGroupStart:
+                groupAgents = []
+            groupAgents.append(getProductToken(value))
+            isGroupStart = True
+            hasAgentGroup = hasAgentGroup or groupAgents[-1] == userAgent
+        else:
+            isGroupStart = False
+            for groupAgent in groupAgents:
+                if groupAgent == "*":
+                    rules: RobotsRules = defaultRules
+                elif groupAgent == userAgent:
+                    rules: RobotsRules = agentRules
+                else:
+                    continue
+                if field in ("allow", "disallow"):
+                    rules.addRule(value, field == "allow")
+                elif field == "crawl-delay":
+                    try:
+                        rules.crawlDelay = float(value)
+                    except ValueError:
+                        pass
+    return agentRules if hasAgentGroup else defaultRules
+
+
+class SitemapEntry(NamedTuple):
+    loc: str
+    lastmod: str  # W3C datetime as given (e.g. "2022-08-01T10:00:00+00:00"), "" if missing.
+    isSitemap: bool  # True for the entries of a sitemap index, which point to more sitemaps.
+
+
+# Parses a sitemap or sitemap index file (gzipped or not) without loading all of it into memory.
+# Only the loc and lastmod elements right inside url or sitemap are read. The extensions have their own loc elements
+#   deeper inside, e.g. <url><image:image><image:loc>, which are the URLs of the images and not of the page.
+# A file that isn't valid XML ends the iteration where it breaks.
+def iterSitemap(filePath: str) -> Iterator[SitemapEntry]:
+    with open(filePath, "rb") as f:
+        isGzipped: bool = f.read(2) == b"\x1f\x8b"
+    with (GzipFile(filePath, "rb") if isGzipped else open(filePath, "rb")) as f:
+        loc: str = ""
+        lastmod: str = ""
+        depth: int = 0  # The number of open elements. At the end of a loc of a url it's 2: urlset and url.
+        try:
+            for event, element in iterparse(f, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    continue
+                depth -= 1
+                # Tags come with their namespace, e.g. "{http://www.sitemaps.org/schemas/sitemap/0.9}loc".
+                tag: str = element.tag.rsplit("}", 1)[-1]
+                if depth == 2 and tag == "loc":
+                    loc = (element.text or "").strip()
+                elif depth == 2 and tag == "lastmod":
+                    lastmod = (element.text or "").strip()
+                elif depth == 1 and tag in ("url", "sitemap"):
+                    if loc:
+                        yield SitemapEntry(loc, lastmod, tag == "sitemap")
+                    loc, lastmod = "", ""
+                    element.clear()
+        except (ParseError, EOFError, OSError):
+            return
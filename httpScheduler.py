@@ -0,0 +1,174 @@
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from heapq import heappush, heappop, heapreplace
+from itertools import count
+from math import inf
+from time import monotonic
+from typing import Any, Union
+from httpUtils import Response
+
+# Responses telling the client to slow down. Their requests are penalized and sent again later.
+throttleStatusCodes: set[str] = {"429", "503"}
+
+
+# Returns the seconds to wait according to the Retry-After header of the response (a number of seconds or an
+#   HTTP date), or None if it has none.
+def getRetryAfter(response: Response) -> Union[float, None]:
+    retryAfter: str = response.headers.get("retry-after", "").strip()
+    if retryAfter.isdigit():
+        return float(retryAfter)
+    try:
+        return max(0.0, (parsedate_to_datetime(retryAfter) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+# Allows rate requests per second on average and up to burst requests at once.
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "lastUpdate")
+
+    def __init__(self, rate: float = inf, burst: int = 1):
+        self.rate: float = rate
+        self.burst: int = burst
+        self.tokens: float = burst
+        self.lastUpdate: float = monotonic()
+
+    def __refill(self, now: float) -> None:
+        if self.rate == inf:
+            self.tokens = self.burst
+        else:
+            self.tokens = min(self.burst, self.tokens + (now - self.lastUpdate) * self.rate)
+        self.lastUpdate = now
+
+    # Returns the seconds until a token is available.
+    def getWaitTime(self, now: float) -> float:
+        self.__refill(now)
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self.__refill(now)
+        self.tokens -= 1
+
+
+class HostState:
+    __slots__ = ("bucket", "baseRate", "queue", "deferredQueue", "blockedUntil", "penaltiesNum", "isScheduled")
+
+    def __init__(self, rate: float, burst: int):
+        self.bucket: TokenBucket = TokenBucket(rate, burst)
+        self.baseRate: float = rate  # The rate the bucket returns to after being slowed down.
+        self.queue: deque = deque()
+        self.deferredQueue: deque = deque()  # Only popped when queue is empty.
+        self.blockedUntil: float = 0
+        self.penaltiesNum: int = 0  # Penalties in a row, without a successful request between them.
+        self.isScheduled: bool = False  # Whether the host is in the heap. Only hosts with queued work are.
+
+    def hasWork(self) -> bool:
+        return bool(self.queue or self.deferredQueue)
+
+    def getEligibleTime(self, now: float) -> float:
+        return max(self.blockedUntil, now + self.bucket.getWaitTime(now))
+
+
+# Queues work per host and hands it out in the order the hosts become eligible, so a slow or throttling host never
+#   holds back the others. Every host has its own token bucket, created with the default rate and burst.
+# A throttled host (see penalize) is blocked for the Retry-After time or an exponential penalty, and its rate is
+#   halved. Every successful request (see reward) brings it back up by recoveryFactor, up to the original rate.
+class HostScheduler:
+    def __init__(self, rate: float = inf, burst: int = 1, basePenalty: float = 1, maxPenalty: float = 300,
+                 recoveryFactor: float = 1.25):
+        self.rate: float = rate
+        self.burst: int = burst
+        self.basePenalty: float = basePenalty
+        self.maxPenalty: float = maxPenalty
+        self.recoveryFactor: float = recoveryFactor
+        self.hosts: dict[str, HostState] = dict()
+        # (eligible time, insertion order, host). The time may be outdated, and is checked again before using it.
+        self.__heap: list[tuple[float, int, str]] = []
+        self.__counter = count()
+        self.__itemsNum: int = 0
+        self.deferredNum: int = 0
+
+    def __len__(self):
+        return self.__itemsNum
+
+    def __getHost(self, host: str) -> HostState:
+        if host not in self.hosts:
+            self.hosts[host] = HostState(self.rate, self.burst)
+        return self.hosts[host]
+
+    def setRate(self, host: str, rate: float, burst: int = None) -> None:
+        state: HostState = self.__getHost(host)
+        state.bucket.rate = state.baseRate = rate
+        if burst is not None:
+            state.bucket.burst = burst
+
+    # Crawl-delay from robots.txt caps the host at one request every crawlDelay seconds.
+    def setCrawlDelay(self, host: str, crawlDelay: float) -> None:
+        if crawlDelay > 0:
+            self.setRate(host, min(self.__getHost(host).baseRate, 1 / crawlDelay), 1)
+
+    # Deferred items of a host are only popped after all of its other items.
+    def push(self, host: str, item: Any, isFirst: bool = False, isDeferred: bool = False) -> None:
+        state: HostState = self.__getHost(host)
+        queue: deque = state.deferredQueue if isDeferred else state.queue
+        if isFirst:
+            queue.appendleft(item)
+        else:
+            queue.append(item)
+        self.__itemsNum += 1
+        self.deferredNum += isDeferred
+        self.__schedule(host, state, monotonic())
+
+    def __schedule(self, host: str, state: HostState, now: float) -> None:
+        if not state.isScheduled and state.hasWork():
+            state.isScheduled = True
+            heappush(self.__heap, (state.getEligibleTime(now), next(self.__counter), host))
+
+    # Returns the seconds until the next item is eligible, inf if there are none.
+    def getWaitTime(self) -> float:
+        now: float = monotonic()
+        while self.__heap:
+            eligibleTime, _, host = self.__heap[0]
+            currEligibleTime: float = self.hosts[host].getEligibleTime(now)
+            if currEligibleTime <= eligibleTime:
+                return max(0.0, eligibleTime - now)
+            # The host was penalized since it was scheduled.
+            heapreplace(self.__heap, (currEligibleTime, next(self.__counter), host))
+        return inf
+
+    # Returns (host, item) of the next eligible item, taking a token of its host, or None if no item is eligible yet.
+    def pop(self) -> Union[tuple[str, Any], None]:
+        if self.getWaitTime() > 0:
+            return None
+        now: float = monotonic()
+        host: str = heappop(self.__heap)[2]
+        state: HostState = self.hosts[host]
+        state.isScheduled = False
+        state.bucket.take(now)
+        if state.queue:
+            item: Any = state.queue.popleft()
+        else:
+            item: Any = state.deferredQueue.popleft()
+            self.deferredNum -= 1
+        self.__itemsNum -= 1
+        self.__schedule(host, state, now)
+        return host, item
+
+    def penalize(self, host: str, retryAfter: float = None) -> float:
+        state: HostState = self.__getHost(host)
+        state.penaltiesNum += 1
+        if retryAfter is None:
+            retryAfter = min(self.maxPenalty, self.basePenalty * 2 ** (state.penaltiesNum - 1))
+        state.blockedUntil = max(state.blockedUntil, monotonic() + retryAfter)
+        if state.bucket.rate == inf:
+            state.bucket.rate = 1 / max(retryAfter, self.basePenalty)
+        else:
+            state.bucket.rate /= 2
+        return retryAfter
+
+    def reward(self, host: str) -> None:
+        state: HostState = self.__getHost(host)
+        state.penaltiesNum = 0
+        if state.bucket.rate < state.baseRate:
+            state.bucket.rate = min(state.baseRate, state.bucket.rate * self.recoveryFactor)
@@ -1,9 +1,13 @@
 from datetime import datetime, timedelta
 from re import match, findall, sub
-from typing import Union
+from typing import Union, Iterable
+from random import uniform
+from threading import Lock, RLock
+import os
+from sys import intern
+from hashlib import blake2b
 from gzip import decompress as gzipDecompress
-from zlib import decompress as zlibDecompress
-from brotli import decompress as brotliDecompress
+from zlib import decompress as zlibDecompress, error as zlibError
 
 validUrlRegex = r"^^(([a-zA-Z]+):\/\/)?([a-zA-Z0-9_%-]+(\.[a-zA-Z0-9_%-]+)+)(:(\d+))?((\/[\w%,-]*(\.\w+)*(\?\w+(=[\w%\.,+-]+)?)?([&|;]\w*(=[\w%\.,-]+)?)*)*)(#([:~=\w%?-]+))?$"
 toFindUrlRegex = r"((([a-zA-Z]+):\/\/)([a-zA-Z0-9_%-]+(\.[a-zA-Z0-9_%-]+)+)(:(\d+))?(\/[\w%,-]*(\.\w+)*(\?\w+(=[\w%+\.]+)?)?([&;]\w*(=[\w%\.,-]+)?)*)*(#[\w%]*)?)|(([a-zA-Z0-9_%-]+(\.[a-zA-Z0-9_%-]+)+)(:(\d+))?(\/[\w%,-]*(\.\w+)*(\?\w+(=[\w%+\.]+)?)?([&;]\w*(=[\w%\.,-]+)?)*)+(#[\w%]*)?)"
@@ -12,31 +16,41 @@ validCookieRegex = r"^([\\\w~-]+)=([\\\w%-=]+)((; [\\\w-]+(=[.\\\w, :\\\/?-]+)?)
 findCookieAttributesRegex = r"(; ([\w-]+)(=([.\w, :\/-]+))?)"
 
 
+# Immutable: the segments are kept in a tuple and the hash is computed once, so paths can be used as dict keys.
 class UrlPath:
+    __slots__ = ("parts", "__hash")
 
-    def __init__(self, pathList: [str]):
-        self.pathList: [str] = pathList
+    def __init__(self, pathList: Union[Iterable[str], "UrlPath"]):
+        self.parts: tuple[str, ...] = pathList.parts if isinstance(pathList, UrlPath) else tuple(pathList)
+        self.__hash: int = hash(self.parts)
+
+    # A list copy of the segments, the object itself only holds the tuple.
+    @property
+    def pathList(self) -> list[str]:
+        return list(self.parts)
 
     def __bool__(self):
-        return bool(self.pathList)
+        return bool(self.parts)
 
     def __str__(self):
-        return f"/{'/'.join(self.pathList)}"
+        return f"/{'/'.join(self.parts)}"
 
     def __repr__(self):
         return str(self)
 
     def __len__(self):
-        return len(self.pathList)
+        return len(self.parts)
 
     def __eq__(self, other):
-        return self.pathList == other.pathList
+        if not isinstance(other, UrlPath):
+            return NotImplemented
+        return self.__hash == other.__hash and self.parts == other.parts
 
     def __hash__(self):
-        return hash(self.pathList)
+        return self.__hash
 
     def __getitem__(self, index):
-        return self.pathList[index]
+        return self.parts[index]
 
 
 def parsePath(urlStr: str) -> UrlPath:
@@ -54,21 +68,27 @@ def parsePath(urlStr: str) -> UrlPath:
     pathList: [str] = newPathStr.split("/")
     if pathStr.endswith("/"):
         pathList = pathList[:-1]
-    return UrlPath(pathList)
+    # Segments repeat a lot between the URLs of a site (e.g. "he", "index.html"), so they are interned as well.
+    return UrlPath(map(intern, pathList))
 
 
 class URL:
+    # The scheme, domain and port strings are interned since a crawl holds thousands of URLs of the same few hosts.
+    # urlStr is kept as given, it can't be rebuilt from the parsed parts (e.g. a trailing slash isn't kept in path).
+    __slots__ = ("urlStr", "scheme", "domain", "port", "path", "fragment", "__hash")
 
     def __init__(self, urlStr: str):
         urlMatch = match(validUrlRegex, urlStr)
         if not urlMatch:
             raise ValueError(f"Invalid URL- {urlStr}")
         self.urlStr: str = urlStr
-        self.scheme: str = "" if urlMatch.group(2) is None else urlMatch.group(2)
-        self.domain: str = urlMatch.group(3)
-        self.port: str = "" if urlMatch.group(6) is None else urlMatch.group(6)
+        self.scheme: str = "" if urlMatch.group(2) is None else intern(urlMatch.group(2))
+        self.domain: str = intern(urlMatch.group(3))
+        self.port: str = "" if urlMatch.group(6) is None else intern(urlMatch.group(6))
         self.path: UrlPath = parsePath(urlMatch.group(7))
         self.fragment: str = "" if urlMatch.group(15) is None else urlMatch.group(15)
+        # Made of exactly the fields compared by __eq__.
+        self.__hash: int = hash((self.domain, self.port, self.path))
 
     def fullUrlStr(self) -> str:
         return f"{self.getSchemeStr()}{self.domain}{self.getPortStr()}{self.path}{self.getFragmentStr()}"
@@ -89,11 +109,13 @@ class URL:
         return f"{self.scheme}{self.domain}{self.path}"
 
     def __eq__(self, other):
-        return self.domain == other.domain and self.port == other.port and \
-               self.path == other.path
+        if not isinstance(other, URL):
+            return NotImplemented
+        return self.__hash == other.__hash and self.domain == other.domain and self.port == other.port and \
+            self.path == other.path
 
     def __hash__(self):
-        return hash(self.fullUrlStr())
+        return self.__hash
 
 
 def getQueriesFromUrl(urlStr: str) -> [str]:
@@ -101,6 +123,8 @@ def getQueriesFromUrl(urlStr: str) -> [str]:
 
 
 class Cookie:
+    __slots__ = ("domain", "name", "value", "attributes")
+
     def __init__(self, cookieName: str, cookieValue: str, domain: str, cookieAttributes: dict[str] = None):
         if cookieAttributes is None:
             cookieAttributes: dict[str] = dict()
@@ -125,7 +149,7 @@ class Cookie:
     def fullCookieStr(self) -> str:
         fullStr = f"{self.name}={self.value}"
         for attribute in self.attributes:
-            if self.attributes[attribute] == True:
+            if self.attributes[attribute] is True:
                 fullStr += f"; {attribute}"
             else:
                 fullStr += f"; {attribute}={self.attributes[attribute]}"
@@ -195,9 +219,11 @@ class CookieJarNode:
         return f"{self.name}"
 
 
+# The jar may be shared by the conversations of several threads (see mapDomain), so changes to it are locked.
 class CookieJar:
     def __init__(self):
         self.root: CookieJarNode = CookieJarNode("root")
+        self.__lock: RLock = RLock()
 
     def __traverse(self, domain: str, path: UrlPath, create: bool) -> Union[CookieJarNode, None]:
         currentNode: CookieJarNode = self.root
@@ -208,7 +234,7 @@ class CookieJar:
                 currentNode = currentNode.addChild(domain)
             else:
                 return None
-        for nodeName in path.pathList:
+        for nodeName in path.parts:
             if nodeName not in currentNode.children:
                 if create:
                     currentNode = currentNode.addChild(nodeName)
@@ -219,23 +245,26 @@ class CookieJar:
         return currentNode
 
     def addRemoveCookie(self, cookie: Cookie) -> None:
-        if cookie.value == "deleted" or cookie.isExpired():
-            self.remove(cookie)
-        else:
-            self.__traverse(cookie.domain, UrlPath(cookie.getAttribute("path")), create=True).addCookie(cookie)
+        with self.__lock:
+            if cookie.value == "deleted" or cookie.isExpired():
+                self.remove(cookie)
+            else:
+                self.__traverse(cookie.domain, UrlPath(cookie.getAttribute("path")), create=True).addCookie(cookie)
 
     def remove(self, toBeRemovedCookie: Cookie) -> None:
-        node: CookieJarNode = self.__traverse(toBeRemovedCookie.domain, UrlPath(toBeRemovedCookie.getAttribute("path")),
-                                              create=False)
-        if node is not None:
-            for cookie in node.cookies:
-                if cookie.name == toBeRemovedCookie.name:
-                    node.cookies.remove(cookie)
-                    return
+        with self.__lock:
+            node: CookieJarNode = self.__traverse(toBeRemovedCookie.domain,
+                                                  UrlPath(toBeRemovedCookie.getAttribute("path")), create=False)
+            if node is not None:
+                for cookie in node.cookies:
+                    if cookie.name == toBeRemovedCookie.name:
+                        node.cookies.remove(cookie)
+                        return
         raise TimeoutError(f"New cookie <{toBeRemovedCookie}> is expired or deleted")
 
     def visit(self, url: URL) -> None:
-        self.__traverse(url.domain, UrlPath(url.path), create=True).isVisited = True
+        with self.__lock:
+            self.__traverse(url.domain, UrlPath(url.path), create=True).isVisited = True
 
     def isVisited(self, url: URL) -> bool:
         node: CookieJarNode = self.__traverse(url.domain, UrlPath(url.path), create=False)
@@ -251,7 +280,7 @@ class CookieJar:
             cookieList.extend(currNode.cookies)
         else:
             return cookieList
-        for nodeName in url.path.pathList:
+        for nodeName in url.path.parts:
             if nodeName in currNode.children:
                 currNode = currNode.children[nodeName]
                 cookieList.extend(currNode.cookies)
@@ -286,6 +315,9 @@ class CookieJar:
 
 
 class Response:
+    __slots__ = ("url", "responseString", "httpVersion", "statusCode", "statusMessage", "__body", "headers", "cookies",
+                 "isBodySkipped")
+
     def __init__(self, url: URL):
         self.url: URL = url
         self.responseString: str = ""
@@ -295,6 +327,21 @@ class Response:
         self.body: str = ""
         self.headers: dict[str, str] = dict()
         self.cookies: list[Cookie] = list()
+        # True when the body wasn't downloaded (or was thrown away) because of its Content-Type.
+        self.isBodySkipped: bool = False
+
+    # The body can also be an object with a load() method returning it (see httpHistory.SpilledBody), which keeps it
+    #   out of memory until it is needed.
+    @property
+    def body(self) -> str:
+        return self.__body if isinstance(self.__body, str) else self.__body.load()
+
+    @body.setter
+    def body(self, body) -> None:
+        self.__body = body
+
+    def getContentType(self) -> str:
+        return self.headers.get("content-type", "").split(";")[0].strip().lower()
 
     def rebuildResponse(self) -> str:
         responseString: str = f"{self.httpVersion} {self.statusCode} {self.statusMessage}\r\n"
@@ -308,14 +355,15 @@ class Response:
         return f"{self.responseString}\r\n{self.body}"
 
 
-def parseResponse(responseBytes: bytes, url: URL) -> Response:
+# With parseBody=False only the status line, headers and cookies are parsed and the body is left empty,
+#   for when the (CPU heavy) decompression and decoding is done elsewhere (see httpParsePool).
+def parseResponse(responseBytes: bytes, url: URL, parseBody: bool = True) -> Response:
     if not (responseBytes.startswith(b"HTTP/") and b"\r\n\r\n" in responseBytes):
         raise ValueError("Invalid response string")
     responseParts: list[bytes] = responseBytes.split(b"\r\n\r\n", 1)
     responseString: str = responseParts[0].decode("utf-8")
     contentBytes: bytes = responseParts[1]
     response: Response = Response(url)
-    # TODO responseString = sub(r"[\da-fA-F]{3,8}(\r\n|\n)", "", responseString)
     response.responseString = responseString
     responseHeadersLines: list[str] = responseString.split("\r\n")
     statusList = responseHeadersLines[0].split(" ")
@@ -337,24 +385,156 @@ def parseResponse(responseBytes: bytes, url: URL) -> Response:
             if not isAlreadyInList:
                 response.cookies.append(currentCookie)
         response.headers[headerName] = headerValue
+    if not parseBody:
+        return response
     content = contentBytes
+    # The chunks have to be joined before decompressing, the compressed stream is split between them.
+    if "chunked" in response.headers.get("transfer-encoding", "").lower():
+        content = decodeChunked(content)
     if "content-encoding" in response.headers:
+        # The encodings are listed in the order they were applied, so they are undone from the last.
         encodingsList: list[str] = response.headers["content-encoding"].split(",")
-        for encoding in encodingsList:
+        for encoding in reversed(encodingsList):
             encoding = encoding.strip().lower()
-            if encoding == "gzip":
-                content = gzipDecompress(contentBytes)
-            elif encoding == "deflate":
-                content = zlibDecompress(contentBytes)
-            elif encoding == "br":
-                content = brotliDecompress(contentBytes)
-            else:
-                raise ValueError(f"Unsupported encoding <{encoding}>")
-    content = sub(r"[\da-fA-F]{3,8}(\r\n|\n)", "", content.decode("ISO-8859-1"))
-    response.body = content
+            # A truncated or corrupt body raises EOFError, OSError (BadGzipFile) or the error of its library, they are
+            #   raised as ValueError like the rest of the invalid responses.
+            try:
+                if encoding == "gzip":
+                    content = gzipDecompress(content)
+                elif encoding == "deflate":
+                    content = zlibDecompress(content)
+                elif encoding == "br":
+                    # brotli is only imported once a response needs it, it's slow to import and most runs never do.
+                    from brotli import decompress as brotliDecompress, error as brotliError
+                    try:
+                        content = brotliDecompress(content)
+                    except brotliError as e:
+                        raise ValueError(f"Invalid br body: {e}") from e
+                elif encoding != "identity":
+                    raise ValueError(f"Unsupported encoding <{encoding}>")
+            except (EOFError, OSError, zlibError) as e:
+                raise ValueError(f"Invalid {encoding} body: {e}") from e
+    response.body = content.decode("ISO-8859-1")
     return response
 
 
+# Decodes a body sent with "Transfer-Encoding: chunked" as it arrives, so it can be written out without keeping it
+#   all in memory (see https://httpwg.org/specs/rfc9112.html#chunked.encoding).
+# Trailer fields after the last chunk are skipped. isDone is set once the empty line ending them was received, so the
+#   whole message was read off the connection.
+class ChunkedDecoder:
+    def __init__(self):
+        self.isDone: bool = False
+        self.__buffer: bytes = b""
+        self.__chunkLeft: int = 0  # Bytes of the current chunk's data that weren't received yet.
+        self.__isCrlfLeft: bool = False  # Whether the CRLF after the current chunk's data wasn't received yet.
+        self.__isInTrailer: bool = False  # Whether the last chunk was received and the trailer section wasn't.
+
+    # Returns the body bytes found in the given data (and in data left over from the previous calls).
+    def decode(self, data: bytes) -> bytes:
+        self.__buffer += data
+        bodyParts: list[bytes] = []
+        while not self.isDone:
+            if self.__chunkLeft > 0:
+                if not self.__buffer:
+                    break
+                bodyPart: bytes = self.__buffer[:self.__chunkLeft]
+                bodyParts.append(bodyPart)
+                self.__buffer = self.__buffer[len(bodyPart):]
+                self.__chunkLeft -= len(bodyPart)
+                self.__isCrlfLeft = self.__chunkLeft == 0
+            elif self.__isCrlfLeft:
+                if len(self.__buffer) < 2:
+                    break
+                self.__buffer = self.__buffer[2:]
+                self.__isCrlfLeft = False
+            elif self.__isInTrailer:
+                lineEnd: int = self.__buffer.find(b"\r\n")
+                if lineEnd == -1:
+                    break
+                self.__buffer = self.__buffer[lineEnd + 2:]
+                self.isDone = lineEnd == 0
+            else:
+                sizeLineEnd: int = self.__buffer.find(b"\r\n")
+                if sizeLineEnd == -1:
+                    break
+                # Chunk extensions (after ';') are ignored.
+                sizeStr: bytes = self.__buffer[:sizeLineEnd].split(b";")[0].strip()
+                self.__buffer = self.__buffer[sizeLineEnd + 2:]
+                try:
+                    self.__chunkLeft = int(sizeStr, 16)
+                except ValueError:
+                    raise ValueError(f"Invalid chunk size <{sizeStr}>")
+                if self.__chunkLeft == 0:
+                    self.__isInTrailer = True
+        return b"".join(bodyParts)
+
+
+# Returns the (start, end, total) values of a Content-Range header, e.g. "bytes 100-199/1000" -> (100, 199, 1000).
+# Unknown values are -1: "bytes */1000" -> (-1, -1, 1000) and "bytes 100-199/*" -> (100, 199, -1).
+def parseContentRange(contentRange: str) -> tuple[int, int, int]:
+    rangeMatch = match(r"^bytes (\*|(\d+)-(\d+))/(\*|\d+)$", contentRange.strip())
+    if not rangeMatch:
+        raise ValueError(f"Invalid Content-Range <{contentRange}>")
+    start: int = -1 if rangeMatch.group(2) is None else int(rangeMatch.group(2))
+    end: int = -1 if rangeMatch.group(3) is None else int(rangeMatch.group(3))
+    total: int = -1 if rangeMatch.group(4) == "*" else int(rangeMatch.group(4))
+    return start, end, total
+
+
+# Returns the value to send in If-Range to make sure a range comes from the same version of the file as the response:
+#   its ETag, or its Last-Modified date if it has no ETag or only a weak one (which If-Range doesn't accept).
+def getRangeValidator(response: Response) -> str:
+    validator: str = response.headers.get("etag", "")
+    if validator.startswith("W/") or not validator:
+        validator = response.headers.get("last-modified", "")
+    return validator
+
+
+# Writes data at the given position of the file without moving its offset, so several threads can write different
+#   parts of the same file at once. os.pwrite is missing on Windows, where seeking and writing is done under a lock.
+if hasattr(os, "pwrite"):
+    def positionedWrite(fileDescriptor: int, data: bytes, position: int) -> None:
+        while data:
+            written: int = os.pwrite(fileDescriptor, data, position)
+            data = data[written:]
+            position += written
+else:
+    positionedWriteLock: Lock = Lock()
+
+    def positionedWrite(fileDescriptor: int, data: bytes, position: int) -> None:
+        with positionedWriteLock:
+            os.lseek(fileDescriptor, position, os.SEEK_SET)
+            while data:
+                data = data[os.write(fileDescriptor, data):]
+
+
+# Decodes a whole chunked body. An incomplete body is decoded up to where it was cut.
+def decodeChunked(content: bytes) -> bytes:
+    return ChunkedDecoder().decode(content)
+
+
+# Returns the length of the body of a response from its headers: 0 when it can't have a body, the Content-Length
+#   value if given and -1 when the body is chunked or ends when the connection is closed.
+def getResponseBodyLength(response: Response, requestType: str) -> int:
+    if requestType.upper() == "HEAD" or response.statusCode.startswith("1") or response.statusCode in ("204", "304"):
+        return 0
+    if "chunked" in response.headers.get("transfer-encoding", "").lower():
+        return -1
+    if response.headers.get("content-length", "").isdigit():
+        return int(response.headers["content-length"])
+    return -1
+
+
+htmlContentTypes: set[str] = {"text/html", "application/xhtml+xml"}
+
+
+# A missing Content-Type counts as HTML, the body might still contain links.
+def isHtmlContentType(contentType: str) -> bool:
+    contentType = contentType.split(";")[0].strip().lower()
+    return contentType == "" or contentType in htmlContentTypes
+
+
 class Request:
     # optionalHeaders: dict[str, str] = {}
 
@@ -450,9 +630,17 @@ def parseRequest(requestString: str) -> Request:
     return request
 
 
+# Methods that can be safely sent again after a failed attempt (see RFC 9110 section 9.2.2).
+idempotentMethods: set[str] = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE"}
+
+
 class Connection:
+    __slots__ = ("name", "url", "requestType", "content", "headers", "request", "response", "isUserAction", "timeOut",
+                 "maxRetries", "parsed", "htmlOnly", "followRedirects")
+
     def __init__(self, url: Union[str, URL], requestType: str, name: str, content: str = "",
-                 headers: dict[str, str] = None, isUserActivation: bool = False):
+                 headers: dict[str, str] = None, isUserActivation: bool = False, timeOut: float = None,
+                 maxRetries: int = None, htmlOnly: bool = False, followRedirects: bool = True):
         self.name: str = name
         if isinstance(url, str):
             self.url: URL = URL(url)
@@ -463,12 +651,66 @@ class Connection:
         self.headers: dict[str, str] = headers
         self.request: Request = None
         self.response: Response = None
+        # A future of the httpParsePool.ParsedPage of the response when it is parsed by a process pool.
+        self.parsed = None
         self.isUserAction: bool = isUserActivation
+        # Per-connection overrides of the conversation's deadline and retry count (None uses the defaults).
+        self.timeOut: float = timeOut
+        self.maxRetries: int = maxRetries
+        # Whether the body should be skipped if the response turns out not to be HTML (see nonHtmlPolicy).
+        self.htmlOnly: bool = htmlOnly
+        # Without it a redirect response is the result of the connection, for callers that follow redirects with
+        #   another conversation (a conversation is bound to a port and to TLS or plain sockets).
+        self.followRedirects: bool = followRedirects
+
+    def isIdempotent(self) -> bool:
+        return self.requestType.upper() in idempotentMethods
 
     def __str__(self):
         return f"{self.name}"
 
 
+# Returns the delay before the given retry attempt (starting from 1) using exponential backoff with "full jitter":
+#   a uniformly random delay between 0 and min(maxDelay, baseDelay * 2 ** (attempt - 1)).
+# The randomness keeps many workers that failed together from retrying together.
+def getBackoffDelay(attempt: int, baseDelay: float, maxDelay: float) -> float:
+    return uniform(0, min(maxDelay, baseDelay * 2 ** (attempt - 1)))
+
+
+# Keeps a sliding window of the latest request latencies (times to the response headers) of every host and derives a
+#   timeout from them.
+# A host that usually answers in 200ms gets a timeout of a few hundred milliseconds instead of the full default,
+#   so a host that suddenly stalls is cut off quickly.
+class HostLatencyTracker:
+    def __init__(self, windowSize: int = 50, percentile: float = 0.95, multiplier: float = 4,
+                 minTimeOut: float = 1, minSamples: int = 5):
+        self.windowSize: int = windowSize
+        self.percentile: float = percentile
+        self.multiplier: float = multiplier
+        self.minTimeOut: float = minTimeOut
+        self.minSamples: int = minSamples
+        self.latencies: dict[str, list[float]] = dict()
+
+    def record(self, host: str, latency: float) -> None:
+        hostLatencies: list[float] = self.latencies.setdefault(host, [])
+        hostLatencies.append(latency)
+        if len(hostLatencies) > self.windowSize:
+            del hostLatencies[0]
+
+    def getPercentile(self, host: str) -> Union[float, None]:
+        if len(self.latencies.get(host, [])) < self.minSamples:
+            return None
+        sortedLatencies: list[float] = sorted(self.latencies[host])
+        return sortedLatencies[min(len(sortedLatencies) - 1, int(self.percentile * len(sortedLatencies)))]
+
+    # Returns defaultTimeOut until enough samples were collected, and never more than it afterwards.
+    def getTimeOut(self, host: str, defaultTimeOut: float) -> float:
+        percentileLatency: Union[float, None] = self.getPercentile(host)
+        if percentileLatency is None:
+            return defaultTimeOut
+        return min(defaultTimeOut, max(self.minTimeOut, percentileLatency * self.multiplier))
+
+
 # Returns the current time using the HTTP time format
 #   (as explained in: https://httpwg.org/specs/rfc7231.html#http.date).
 def getCurrHttpTime() -> str:
@@ -493,19 +735,67 @@ def getLinksFromHTML(html: str, toFindRegex: str = toFindUrlRegex) -> [URL]:
     return URLs
 
 
+# Returns the path and query of the URL as written in it. str(url.path) drops trailing slashes, which servers and
+#   robots.txt rules tell apart ("Disallow: /private/" doesn't match "/private").
+def getRequestPath(url: URL) -> str:
+    urlNoScheme: str = url.urlStr.split("://", 1)[-1].split("#")[0]
+    return urlNoScheme[urlNoScheme.find("/"):] if "/" in urlNoScheme else "/"
+
+
+# Long names are truncated, with a digest of the whole name at the end so URLs sharing a prefix don't collide.
 def getUrlName(url: URL) -> str:
-    name = f"{url.domain}_{'_'.join(url.path.pathList)}".replace("?", "_").strip(r"\:*?<>|")
+    name = f"{url.domain}_{'_'.join(url.path.parts)}".replace("?", "_").strip(r"\:*?<>|")
     if len(name) > 100:
-        name = name[:60]
+        name = f"{name[:51]}_{blake2b(name.encode(), digest_size=4).hexdigest()}"
     return name
 
 
+fileExtensions: set[str] = {".aac", ".avif", ".avi", ".bmp", ".doc", ".docx", ".flv", ".gif", ".ico", ".jpeg", ".jpg",
+                             ".mid", ".midi", ".mp3", ".mp4", ".mpeg", ".mpg", ".oga", ".ogv", ".opus", ".otf", ".png",
+                             ".pdf", ".svg", ".swf", ".tif", ".tiff", ".ts", ".ttf", ".wav", ".weba", ".webm", ".webp",
+                             ".woff", ".woff2", ".3gp", ".3g2", ".js", ".css", ".zip", ".rar", ".7z", ".gz", ".xls",
+                             ".xlsx", ".ppt", ".pptx", ".exe", ".msi"}
+
+
+# Returns the extension of the last segment of the path (without its query), e.g. ".pdf", or "" if it has none.
+def getUrlExtension(url: URL) -> str:
+    if not url.path:
+        return ""
+    lastSegment: str = url.path[-1].split("?")[0]
+    dotIndex: int = lastSegment.rfind(".")
+    return lastSegment[dotIndex:].lower() if dotIndex != -1 else ""
+
+
 def isFileUrl(url: URL) -> bool:
-    commonMimeTypes: list[str] = [".aac", ".avif", ".avi", ".bmp", ".doc", ".docx", ".flv", ".gif", ".ico", ".jpeg",
-                                  ".jpg", ".mid", ".midi", ".mp3", ".mp4", ".mpeg", ".mpg", ".oga", ".ogv", ".opus",
-                                  ".otf", ".png", ".pdf", ".svg", ".swf", ".tif", ".tiff", ".ts", ".ttf", ".wav",
-                                  ".weba", ".webm", "webp", ".woff", ".woff2", ".3gp", ".3g2", ".js"]
-    for mimeType in commonMimeTypes:
-        if mimeType in url.urlStr:
-            return True
-    return False
+    return getUrlExtension(url) in fileExtensions
+
+
+# Returns a pattern shared by URLs that are likely to return the same kind of content: the directories with their
+#   numbers replaced by '#' and the extension of the last segment, e.g. "moodle.tau.ac.il/pluginfile.php/#/*.pdf".
+def getUrlPattern(url: URL) -> str:
+    directories: str = sub(r"\d+", "#", "/".join(segment.split("?")[0] for segment in url.path.parts[:-1]))
+    return f"{url.domain}/{directories}{'/' if directories else ''}*{getUrlExtension(url)}"
+
+
+# Remembers which Content-Types every URL pattern (see getUrlPattern) returned, so a crawler can skip URLs that only
+#   ever returned non-HTML content, or check them with a HEAD request first when the pattern returned both.
+# A pattern needs minSamples non-HTML responses, making up at least headRatio of its responses, before its URLs get a
+#   HEAD request. A few feeds among the many pages of a pattern like "domain/*" are cheaper to skip while crawling
+#   (see htmlOnly) than a HEAD request before every page.
+class ContentTypeMemo:
+    def __init__(self, minSamples: int = 2, headRatio: float = 0.25):
+        self.minSamples: int = minSamples
+        self.headRatio: float = headRatio
+        # {pattern: [HTML responses, non-HTML responses]}
+        self.patterns: dict[str, list[int]] = dict()
+
+    def record(self, url: URL, contentType: str) -> None:
+        counts: list[int] = self.patterns.setdefault(getUrlPattern(url), [0, 0])
+        counts[0 if isHtmlContentType(contentType) else 1] += 1
+
+    # Returns "GET", "HEAD" (send a HEAD request before getting the body) or "SKIP".
+    def getAction(self, url: URL) -> str:
+        htmlCount, otherCount = self.patterns.get(getUrlPattern(url), (0, 0))
+        if otherCount < self.minSamples or otherCount < self.headRatio * (htmlCount + otherCount):
+            return "GET"
+        return "SKIP" if htmlCount == 0 else "HEAD"
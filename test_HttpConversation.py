@@ -0,0 +1,338 @@
+import os
+import time
+import pytest
+import HttpConversation
+import httpDownloader
+from httpLinkGraph import LinkGraph
+from httpParsePool import ParsePool
+from httpScheduler import HostScheduler
+from httpUtils import URL
+from conftest import LocalRequestHandler
+
+fileContent: bytes = bytes(range(256)) * 4000
+fileETag: str = '"v1"'
+
+
+class FileRequestHandler(LocalRequestHandler):
+    requestsLog: list[dict[str, str]] = []
+
+    # Ranges starting at these offsets are cut in the middle once, to test retrying.
+    failingOffsets: set[int] = set()
+
+    def do_HEAD(self):
+        self.requestsLog.append(dict(self.headers))
+        self.send_response(200)
+        self.send_header("ETag", fileETag)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(len(fileContent)))
+        self.end_headers()
+
+    def do_GET(self):
+        self.requestsLog.append(dict(self.headers))
+        start: int = 0
+        end: int = len(fileContent) - 1
+        if "Range" in self.headers and self.headers.get("If-Range", fileETag) == fileETag:
+            rangeStart, rangeEnd = self.headers["Range"].removeprefix("bytes=").split("-")
+            start = int(rangeStart)
+            end = int(rangeEnd) if rangeEnd else end
+            if start >= len(fileContent):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(fileContent)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(fileContent)}")
+        else:
+            self.send_response(200)
+        self.send_header("ETag", fileETag)
+        body: bytes = fileContent[start:end + 1]
+        if start in self.failingOffsets:
+            self.failingOffsets.remove(start)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        if "chunked" in self.path:
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i in range(0, len(body), 10000):
+                self.wfile.write(f"{len(body[i:i + 10000]):x}\r\n".encode() + body[i:i + 10000] + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+
+@pytest.fixture
+def port(startServer) -> int:
+    FileRequestHandler.requestsLog = []
+    return startServer(FileRequestHandler)
+
+
+def newConversation(port: int) -> HttpConversation.HttpConversation:
+    return HttpConversation.HttpConversation(port=port, isSecure=False, log=False)
+
+
+def test_download(port, tmp_path):
+    for fileName in ["file.bin", "chunked.bin"]:
+        targetPath = str(tmp_path / fileName)
+        with newConversation(port) as conversation:
+            assert conversation.download(f"http://127.0.0.1/{fileName}", targetPath, 4096) == len(fileContent)
+        with open(targetPath, "rb") as f:
+            assert f.read() == fileContent
+        assert not os.path.exists(f"{targetPath}.part")
+
+
+def test_downloadResume(port, tmp_path):
+    targetPath = str(tmp_path / "file.bin")
+    with open(f"{targetPath}.part", "wb") as f:
+        f.write(fileContent[:300000])
+    with open(f"{targetPath}.part.validator", "w") as f:
+        f.write(fileETag)
+    with newConversation(port) as conversation:
+        conversation.download("http://127.0.0.1/file.bin", targetPath)
+    assert FileRequestHandler.requestsLog[-1]["Range"] == "bytes=300000-"
+    with open(targetPath, "rb") as f:
+        assert f.read() == fileContent
+
+
+def test_downloadResumeChangedFile(port, tmp_path):
+    targetPath = str(tmp_path / "file.bin")
+    with open(f"{targetPath}.part", "wb") as f:
+        f.write(b"\0" * 300000)
+    with open(f"{targetPath}.part.validator", "w") as f:
+        f.write('"v0"')
+    with newConversation(port) as conversation:
+        conversation.download("http://127.0.0.1/file.bin", targetPath)
+    with open(targetPath, "rb") as f:
+        assert f.read() == fileContent
+
+
+def test_downloadResumeCompleteFile(port, tmp_path):
+    targetPath = str(tmp_path / "file.bin")
+    with open(f"{targetPath}.part", "wb") as f:
+        f.write(fileContent)
+    with open(f"{targetPath}.part.validator", "w") as f:
+        f.write(fileETag)
+    with newConversation(port) as conversation:
+        assert conversation.download("http://127.0.0.1/file.bin", targetPath) == len(fileContent)
+    assert len(FileRequestHandler.requestsLog) == 1
+
+
+def test_splitToSegments():
+    segments = httpDownloader.splitToSegments(10, 3)
+    assert [(segment.start, segment.end) for segment in segments] == [(0, 3), (4, 7), (8, 9)]
+    assert len(httpDownloader.splitToSegments(10, 8, minSegmentSize=4)) == 2
+    assert len(httpDownloader.splitToSegments(1, 4)) == 1
+    assert httpDownloader.splitToSegments(0, 4) == []
+
+
+def test_segmentedDownload(port, tmp_path):
+    targetPath = str(tmp_path / "file.bin")
+    segmentsNum = 4
+    FileRequestHandler.failingOffsets = {len(fileContent) // segmentsNum}
+    progressReports = []
+    with newConversation(port) as conversation:
+        conversation.retryBackoff = 0.01
+        downloader = httpDownloader.SegmentedDownloader(conversation, segmentsNum, minSegmentSize=1,
+                                                        onProgress=lambda *args: progressReports.append(args))
+        assert downloader.download("http://127.0.0.1/file.bin", targetPath) == len(fileContent)
+    with open(targetPath, "rb") as f:
+        assert f.read() == fileContent
+    segments, _, isFinal = progressReports[-1]
+    assert isFinal and len(segments) == segmentsNum
+    assert [segment.attempts for segment in segments] == [0, 1, 0, 0]
+    assert not FileRequestHandler.failingOffsets
+    assert not os.stat(targetPath).st_mode & 0o111
+
+
+class SiteRequestHandler(LocalRequestHandler):
+    requestedPaths: list[str] = []
+    pages: dict[str, tuple[str, bytes]] = {
+        "/robots.txt": ("text/plain", b"User-agent: *\nDisallow: /private\nSitemap: 127.0.0.1/sitemap.xml\n"),
+        "/sitemap.xml": ("application/xml", b'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                                            b'<url><loc>127.0.0.1/deep/old</loc><lastmod>2020-01-01</lastmod></url>'
+                                            b'<url><loc>127.0.0.1/deep/new</loc><lastmod>2022-01-01</lastmod></url>'
+                                            b'<url><loc>127.0.0.1/private/page</loc></url></urlset>'),
+        "/": ("text/html", b'<html><a href="127.0.0.1/private/a"></a><a href="127.0.0.1/about"></a></html>'),
+    }
+
+    def do_GET(self):
+        path: str = self.getRequestedPath()
+        self.requestedPaths.append(path)
+        contentType, body = self.pages.get(path, ("text/html", b"<html></html>"))
+        self.sendBody(body, contentType)
+
+
+def test_mapDomainRobots(startServer):
+    with HttpConversation.HttpConversation(port=startServer(SiteRequestHandler), isSecure=False, log=False) \
+            as conversation:
+        linkGraph: LinkGraph = LinkGraph()
+        conversation.mapDomain("127.0.0.1/", 4, linkGraph=linkGraph)
+    assert SiteRequestHandler.requestedPaths == ["/robots.txt", "/sitemap.xml", "/", "/deep/new", "/deep/old",
+                                                 "/about"]
+    aboutId: int = linkGraph.getNodeId(URL("127.0.0.1/about"))
+    assert linkGraph.getLinks(0).tolist() == [linkGraph.getNodeId(URL("127.0.0.1/private/a")), aboutId]
+    assert linkGraph.depth[aboutId] == 1 and linkGraph.status[aboutId] == 200
+    assert linkGraph.size[0] == len(SiteRequestHandler.pages["/"][1])
+
+
+class ThrottlingRequestHandler(LocalRequestHandler):
+    requestedPaths: list[str] = []
+    throttledPaths: set[str] = {"/c"}  # Answered with 429 the first time.
+
+    def do_GET(self):
+        path: str = self.getRequestedPath()
+        self.requestedPaths.append(path)
+        if path in self.throttledPaths:
+            self.throttledPaths.remove(path)
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.sendBody(b"<html>" + b"".join(f'<a href="127.0.0.1/{name}"></a>'.encode() for name in "abcd") + b"</html>")
+
+
+def test_mapDomainWorkers(startServer):
+    with HttpConversation.HttpConversation(port=startServer(ThrottlingRequestHandler), isSecure=False, log=False) \
+            as conversation:
+        linkGraph: LinkGraph = LinkGraph()
+        conversation.mapDomain("127.0.0.1/", 5, useRobots=False, linkGraph=linkGraph, workers=3)
+    assert sorted(ThrottlingRequestHandler.requestedPaths) == ["/", "/a", "/b", "/c", "/c", "/d"]
+    assert all(linkGraph.status[nodeId] == 200 for nodeId in range(len(linkGraph)))
+    assert linkGraph.getClickDepths(0).tolist() == [0, 1, 1, 1, 1]
+
+
+class SlowBodyRequestHandler(LocalRequestHandler):
+    # The headers come right away, the body of /big trickles in over about 1.5 seconds.
+    def do_GET(self):
+        parts: list[bytes] = [b"<html>" + b"x" * 1000] + [b"x" * 100000] * (5 if "big" in self.path else 0) + \
+                             [b"</html>"]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(sum(map(len, parts))))
+        self.end_headers()
+        for i, part in enumerate(parts):
+            if i > 0 and "big" in self.path:
+                time.sleep(0.3)
+            self.wfile.write(part)
+            self.wfile.flush()
+
+
+def test_adaptiveTimeOutOnlyCoversHeaders(startServer):
+    with HttpConversation.HttpConversation(port=startServer(SlowBodyRequestHandler), isSecure=False, log=False,
+                                           packetRecvTimeOut=1, requestTimeOut=10) as conversation:
+        for i in range(5):
+            conversation.converse(URL(f"127.0.0.1/small{i}"))
+        # The fast pages bring the budget for the headers down to packetRecvTimeOut, but not the body's.
+        assert conversation.getTimeOut(conversation.currConnection) == 1
+        conversation.converse(URL("127.0.0.1/big"))
+        assert len(conversation.currConnection.response.body) == 501013
+        assert max(conversation.latencyTracker.latencies["127.0.0.1"]) < 1
+
+
+class ChunkedRequestHandler(LocalRequestHandler):
+    # The first chunk ends like the last chunk would, and the body ends with a trailer field.
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        firstChunk: bytes = b"<html><table width=100\r\n"
+        self.wfile.write(f"{len(firstChunk):x}\r\n".encode() + firstChunk + b"\r\n")
+        self.wfile.flush()
+        if "cut" in self.path:
+            self.close_connection = True
+            return
+        time.sleep(0.2)
+        self.wfile.write(b"f\r\n</table></html>\r\n0\r\nExpires: 0\r\n\r\n")
+
+
+def test_chunkedResponse(startServer):
+    with HttpConversation.HttpConversation(port=startServer(ChunkedRequestHandler), isSecure=False, log=False,
+                                           maxRetries=1) as conversation:
+        for _ in range(2):
+            conversation.converse(URL("127.0.0.1/page"))
+            assert conversation.currConnection.response.body == "<html><table width=100\r\n</table></html>"
+        with pytest.raises(ConnectionError):
+            conversation.converse(URL("127.0.0.1/cut"))
+
+
+class CutBodyRequestHandler(LocalRequestHandler):
+    # /cut closes the connection after half of its body, /pause sends the other half after 1.5 seconds.
+    def do_GET(self):
+        body: bytes = b"<html>" + b"x" * 2000 + b"</html>"
+        if "cut" not in self.path and "pause" not in self.path:
+            self.sendBody(body)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body[:1000])
+        self.wfile.flush()
+        if "cut" in self.path:
+            self.close_connection = True
+            return
+        time.sleep(1.5)
+        self.wfile.write(body[1000:])
+
+
+def test_contentLengthResponse(startServer):
+    with HttpConversation.HttpConversation(port=startServer(CutBodyRequestHandler), isSecure=False, log=False,
+                                           packetRecvTimeOut=1, maxRetries=1) as conversation:
+        for path in ["cut", "pause"]:
+            with pytest.raises(ConnectionError):
+                conversation.converse(URL(f"127.0.0.1/{path}"))
+            assert not conversation.keepAlive
+            # The rest of a cut body isn't read as the response to the next request.
+            conversation.converse(URL("127.0.0.1/page"))
+            assert len(conversation.currConnection.response.body) == 2013
+
+
+class SlowPageRequestHandler(LocalRequestHandler):
+    def do_GET(self):
+        if "slow" in self.path:
+            time.sleep(1.5)
+        self.sendBody(b'<html><a href="127.0.0.1/slow"></a><a href="127.0.0.1/a"></a></html>')
+
+
+def test_mapDomainFailedPage(startServer):
+    with HttpConversation.HttpConversation(port=startServer(SlowPageRequestHandler), isSecure=False, log=False,
+                                           requestTimeOut=1, maxRetries=1) as conversation:
+        linkGraph: LinkGraph = LinkGraph()
+        conversation.mapDomain("127.0.0.1/", 3, useRobots=False, linkGraph=linkGraph, workers=2,
+                               scheduler=HostScheduler(basePenalty=0.1))
+    assert linkGraph.status[linkGraph.getNodeId(URL("127.0.0.1/slow"))] == 0
+    assert linkGraph.status[linkGraph.getNodeId(URL("127.0.0.1/a"))] == 200
+
+
+class CorruptPageRequestHandler(LocalRequestHandler):
+    def do_GET(self):
+        if "corrupt" not in self.path:
+            self.sendBody(b'<html><a href="127.0.0.1/corrupt"></a><a href="127.0.0.1/a"></a></html>')
+            return
+        body: bytes = b"not gzip"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def test_mapDomainCorruptPage(startServer):
+    port: int = startServer(CorruptPageRequestHandler)
+    # The body fails to decompress in converse without a parse pool, and in the pool's worker with one.
+    with ParsePool(1) as parsePool:
+        for pool in [None, parsePool]:
+            with HttpConversation.HttpConversation(port=port, isSecure=False, log=False, maxRetries=1,
+                                                   parsePool=pool) as conversation:
+                linkGraph: LinkGraph = LinkGraph()
+                conversation.mapDomain("127.0.0.1/", 3, useRobots=False, linkGraph=linkGraph)
+            assert linkGraph.status[linkGraph.getNodeId(URL("127.0.0.1/corrupt"))] == 0
+            assert linkGraph.status[linkGraph.getNodeId(URL("127.0.0.1/a"))] == 200
@@ -0,0 +1,98 @@
+import gzip
+import io
+import json
+from hashlib import sha1
+import pytest
+import httpBulkFetch
+from conftest import LocalRequestHandler
+
+pageBody: bytes = b'<html><a href="127.0.0.1/a"></a><a href="127.0.0.1/b"></a></html>'
+fileBody: bytes = bytes(range(256)) * 100
+
+
+class BulkRequestHandler(LocalRequestHandler):
+    requestedUrls: list[tuple[int, str]] = []  # The port of the server and the path.
+
+    def do_GET(self):
+        path: str = self.getRequestedPath()
+        self.requestedUrls.append((self.server.server_address[1], path))
+        if path.startswith("/moved/"):
+            # Redirects to /page of the server on the port after /moved/.
+            self.send_response(301)
+            self.send_header("Location", f"http://127.0.0.1:{path.removeprefix('/moved/')}/page")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if path.startswith("/missing"):
+            status, contentType, body = 404, "text/html", b"<html>Not found</html>"
+        elif path == "/file.bin":
+            status, contentType, body = 200, "application/octet-stream", fileBody
+        elif path == "/truncated.gz":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Encoding", "gzip")
+            body = gzip.compress(pageBody)[:20]
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        else:
+            status, contentType, body = 200, "text/html", pageBody
+        self.sendBody(body, contentType, status)
+
+
+@pytest.fixture
+def server(startServer) -> str:
+    return f"http://127.0.0.1:{startServer(BulkRequestHandler)}"
+
+
+def test_readUrls():
+    assert list(httpBulkFetch.readUrls(["a.com/1\n", "\n", "# comment\n", "  b.com/2 \n"])) == ["a.com/1", "b.com/2"]
+
+
+def test_bulkFetch(server, tmp_path):
+    urls: list[str] = [f"{server}/page{i}" for i in range(20)] + [f"{server}/file.bin", f"{server}/missing",
+                                                                  f"{server}/truncated.gz", "not a url"]
+    output: io.StringIO = io.StringIO()
+    assert httpBulkFetch.bulkFetch(iter(urls), output, concurrency=4, bodiesPath=str(tmp_path / "bodies"),
+                                   maxRetries=1) == len(urls)
+    records: dict[str, dict] = {record["url"]: record for record in map(json.loads, output.getvalue().splitlines())}
+    assert set(records) == set(urls)
+    page: dict = records[f"{server}/page0"]
+    assert page["statusCode"] == 200 and page["bodySize"] == len(pageBody)
+    assert page["digest"] == sha1(pageBody).hexdigest()
+    assert page["links"] == ["127.0.0.1/a", "127.0.0.1/b"]
+    assert page["headers"]["content-type"] == "text/html"
+    with open(page["bodyPath"], "rb") as f:
+        assert f.read() == pageBody
+    assert "links" not in records[f"{server}/file.bin"] and records[f"{server}/file.bin"]["bodySize"] == len(fileBody)
+    assert records[f"{server}/missing"]["statusCode"] == 404
+    assert records[f"{server}/truncated.gz"]["error"].startswith("ConnectionError")
+    assert records["not a url"]["error"].startswith("ValueError")
+    # Identical bodies are saved once.
+    assert len(list((tmp_path / "bodies").iterdir())) == 3
+
+
+def test_bulkFetchRedirect(server, startServer):
+    otherPort: int = startServer(BulkRequestHandler)
+    output: io.StringIO = io.StringIO()
+    assert httpBulkFetch.bulkFetch(iter([f"{server}/moved/{otherPort}"]), output, maxRetries=1) == 1
+    record: dict = json.loads(output.getvalue())
+    # The redirect goes to another port, so it's fetched with another conversation.
+    assert record["statusCode"] == 200 and record["digest"] == sha1(pageBody).hexdigest()
+    assert record["finalUrl"] == f"http://127.0.0.1:{otherPort}/page"
+    assert BulkRequestHandler.requestedUrls[-1] == (otherPort, "/page")
+
+
+def test_main(server, tmp_path, capsys):
+    inputPath = tmp_path / "urls.txt"
+    inputPath.write_text(f"{server}/page\n{server}/file.bin\n")
+    outputPath = tmp_path / "records.jsonl"
+    assert httpBulkFetch.main([str(inputPath), "-o", str(outputPath), "-c", "2", "--html-only"]) == 0
+    records: list[dict] = [json.loads(line) for line in outputPath.read_text().splitlines()]
+    assert sorted(record["url"] for record in records) == [f"{server}/file.bin", f"{server}/page"]
+    assert all(record["isBodySkipped"] == record["url"].endswith(".bin") for record in records)
+    skipped: dict = next(record for record in records if record["isBodySkipped"])
+    assert skipped["bodySize"] == len(fileBody) and "digest" not in skipped
+    # Progress goes to stderr, so stdout only ever has records.
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,93 @@
+from random import Random
+import HttpConversation
+from httpDedup import getPageWords, getSimHash, getHammingDistance, SimHashIndex, getDuplicatePattern, \
+    DuplicateFilter, getPageFingerprint
+from httpUtils import URL
+from conftest import LocalRequestHandler, runServer
+
+random: Random = Random(0)
+vocabulary: list[str] = [f"word{i}" for i in range(5000)]
+
+
+def getText(wordsNum: int) -> str:
+    return " ".join(random.choice(vocabulary) for _ in range(wordsNum))
+
+
+def test_getPageWords():
+    html: str = '<html><script>var x = "hidden";</script><style>p {}</style><p class="a">Hello <b>World</b></p></html>'
+    assert getPageWords(html) == ["hello", "world"]
+
+
+def test_getSimHash():
+    text: str = getText(500)
+    nearText: str = text.replace(text.split()[250], "changed", 1)
+    fingerprint: int = getSimHash(text.split())
+    assert fingerprint == getSimHash(text.split())
+    assert getHammingDistance(fingerprint, getSimHash(nearText.split())) <= 3
+    assert getHammingDistance(fingerprint, getSimHash(getText(500).split())) > 10
+    assert getPageFingerprint(f"<html><a href='x'>{text}</a></html>") == fingerprint
+
+
+def test_simHashIndex():
+    index: SimHashIndex = SimHashIndex(3)
+    fingerprints: list[int] = [random.getrandbits(64) for _ in range(1000)]
+    for i, fingerprint in enumerate(fingerprints):
+        index.add(fingerprint, str(i))
+    assert index.find(fingerprints[10] ^ (1 << 5) ^ (1 << 40) ^ (1 << 63)) == "10"
+    assert index.find(fingerprints[10] ^ (1 << 5) ^ (1 << 20) ^ (1 << 40) ^ (1 << 63)) is None
+
+
+def test_getDuplicatePattern():
+    assert getDuplicatePattern(URL("moodle.tau.ac.il/calendar/view.php?view=month&time=1660000000")) == \
+           getDuplicatePattern(URL("moodle.tau.ac.il/calendar/view.php?time=1662000000&view=month#top"))
+    assert getDuplicatePattern(URL("moodle.tau.ac.il/calendar/view.php?view=month")) != \
+           getDuplicatePattern(URL("moodle.tau.ac.il/calendar/view.php?view=month&time=1"))
+
+
+def test_duplicateFilter():
+    duplicateFilter: DuplicateFilter = DuplicateFilter(minSamples=4, skipRatio=0.75)
+    fingerprint: int = random.getrandbits(64)
+    urls: list[URL] = [URL(f"example.com/calendar.php?month={i}") for i in range(10)]
+    assert duplicateFilter.check(urls[0], fingerprint) is None
+    assert duplicateFilter.check(urls[1], fingerprint ^ 1) == str(urls[0])
+    assert duplicateFilter.getAction(urls[9]) == "FETCH"
+    duplicateFilter.check(urls[2], random.getrandbits(64))
+    duplicateFilter.check(urls[3], fingerprint ^ 2)
+    assert duplicateFilter.getAction(urls[9]) == "DEFER"
+    for url in urls[4:9]:
+        duplicateFilter.check(url, fingerprint)
+    assert duplicateFilter.getAction(urls[9]) == "SKIP"
+    assert duplicateFilter.getAction(URL("example.com/calendar.php?year=1")) == "FETCH"
+
+
+# Every article links to the next one and into an endless calendar, whose months are all the same page.
+class TrapRequestHandler(LocalRequestHandler):
+    requestedPaths: list[str] = []
+    calendarText: str = getText(300)
+    articleTexts: list[str] = [getText(300) for _ in range(20)]
+
+    def do_GET(self):
+        path: str = self.getRequestedPath()
+        self.requestedPaths.append(path)
+        if path.startswith("/calendar.php?month="):
+            month: int = int(path.split("=")[1])
+            body: str = f'<html>{self.calendarText} {month}<a href="127.0.0.1/calendar.php?month={month + 1}"></a>'
+        else:
+            article: int = int(path.removeprefix("/article")) + 1 if path.startswith("/article") else 0
+            body: str = f'<html>{self.articleTexts[article]}<a href="127.0.0.1/calendar.php?month={100 * article}">' \
+                        f'</a><a href="127.0.0.1/article{article}"></a>'
+        self.sendBody((body + "</html>").encode())
+
+
+def crawlTrap(skipDuplicates: bool) -> list[str]:
+    TrapRequestHandler.requestedPaths = []
+    with runServer(TrapRequestHandler) as port:
+        with HttpConversation.HttpConversation(port=port, isSecure=False, log=False) as conversation:
+            conversation.mapDomain("127.0.0.1/", 16, useRobots=False, skipDuplicates=skipDuplicates)
+    return TrapRequestHandler.requestedPaths
+
+
+def test_mapDomainSkipsTraps():
+    articlesNum: int = sum(path.startswith("/article") for path in crawlTrap(skipDuplicates=True))
+    articlesNumWithTraps: int = sum(path.startswith("/article") for path in crawlTrap(skipDuplicates=False))
+    assert articlesNum >= 10 and articlesNumWithTraps <= 5
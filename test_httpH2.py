@@ -0,0 +1,177 @@
+import shutil
+import socket
+import ssl
+import subprocess
+import threading
+import pytest
+import HttpConversation
+from httpUtils import Connection, URL
+
+pytest.importorskip("h2")
+from h2.config import H2Configuration
+from h2.connection import H2Connection
+from h2.events import RequestReceived
+
+if shutil.which("openssl") is None:
+    pytest.skip("openssl is needed to make a certificate for the test server", allow_module_level=True)
+
+heldPagesNum: int = 5
+fileBody: bytes = b"\0" * 60000
+
+
+# A TLS server that speaks HTTP/2 when the client offers it (or only HTTP/1.1 if isHttp2 is False).
+# Requests for /page{i} are held until heldPagesNum of them arrived and are then answered in reverse order, which only
+#   works if the client sends them concurrently on one connection.
+class LocalServer:
+    def __init__(self, certPath: str, keyPath: str, isHttp2: bool = True):
+        self.context: ssl.SSLContext = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(certPath, keyPath)
+        self.context.set_alpn_protocols(["h2", "http/1.1"] if isHttp2 else ["http/1.1"])
+        self.listener: socket.socket = socket.create_server(("127.0.0.1", 0))
+        self.port: int = self.listener.getsockname()[1]
+        self.protocols: list[str] = []
+        self.paths: list[str] = []
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                clientSocket, _ = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle, args=(clientSocket,), daemon=True).start()
+
+    def handle(self, clientSocket: socket.socket):
+        try:
+            with self.context.wrap_socket(clientSocket, server_side=True) as tlsSocket:
+                self.protocols.append(tlsSocket.selected_alpn_protocol())
+                if tlsSocket.selected_alpn_protocol() == "h2":
+                    self.handleH2(tlsSocket)
+                else:
+                    self.handleHttp1(tlsSocket)
+        except (OSError, ssl.SSLError):
+            pass
+
+    @staticmethod
+    def getResponse(path: str) -> tuple[str, bytes]:
+        if path == "/file.bin":
+            return "application/octet-stream", fileBody
+        return "text/html", f"<html>{path}</html>".encode()
+
+    def handleH2(self, tlsSocket: ssl.SSLSocket):
+        connection: H2Connection = H2Connection(H2Configuration(client_side=False, header_encoding="utf-8"))
+        connection.initiate_connection()
+        tlsSocket.sendall(connection.data_to_send())
+        heldStreams: list[tuple[int, str]] = []
+        while data := tlsSocket.recv(65536):
+            for event in connection.receive_data(data):
+                if not isinstance(event, RequestReceived):
+                    continue
+                path: str = dict(event.headers)[":path"]
+                self.paths.append(path)
+                heldStreams.append((event.stream_id, path))
+                if path.startswith("/page") and len(heldStreams) < heldPagesNum:
+                    continue
+                for streamId, heldPath in reversed(heldStreams):
+                    contentType, body = self.getResponse(heldPath)
+                    connection.send_headers(streamId, [(":status", "200"), ("content-type", contentType),
+                                                       ("content-length", str(len(body))),
+                                                       ("set-cookie", "session=1; Path=/")])
+                    for i in range(0, len(body), 16384):
+                        connection.send_data(streamId, body[i:i + 16384], end_stream=i + 16384 >= len(body))
+                heldStreams = []
+            tlsSocket.sendall(connection.data_to_send())
+
+    def handleHttp1(self, tlsSocket: ssl.SSLSocket):
+        data: bytes = b""
+        while packet := tlsSocket.recv(65536):
+            data += packet
+            while b"\r\n\r\n" in data:
+                head, data = data.split(b"\r\n\r\n", 1)
+                path: str = "/" + head.split(b" ")[1].decode().split("/", 1)[-1]
+                self.paths.append(path)
+                contentType, body = self.getResponse(path)
+                tlsSocket.sendall(f"HTTP/1.1 200 OK\r\nContent-Type: {contentType}\r\n"
+                                  f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+
+    def close(self):
+        self.listener.close()
+
+
+@pytest.fixture(scope="module")
+def certificate(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("certificate")
+    certPath, keyPath = str(directory / "cert.pem"), str(directory / "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", keyPath, "-out", certPath,
+                    "-days", "1", "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1"],
+                   check=True, capture_output=True)
+    return certPath, keyPath
+
+
+def newConversation(server: LocalServer, certPath: str) -> HttpConversation.HttpConversation:
+    return HttpConversation.HttpConversation(port=server.port, log=False, useHttp2=True, requestTimeOut=5,
+                                             sslContext=ssl.create_default_context(cafile=certPath))
+
+
+def test_converseManyHttp2(certificate):
+    server: LocalServer = LocalServer(*certificate)
+    try:
+        with newConversation(server, certificate[0]) as conversation:
+            urls: list[URL] = [URL("127.0.0.1/")] + [URL(f"127.0.0.1/page{i}") for i in range(heldPagesNum)]
+            conversation.converseMany(urls)
+            assert [connection.response.body for connection in conversation.connectionList] == \
+                   [f"<html>{url.path}</html>".replace("<html></html>", "<html>/</html>") for url in urls]
+            assert all(connection.response.httpVersion == "HTTP/2" for connection in conversation.connectionList)
+            assert conversation.cookieJar.getCookiesStr(URL("127.0.0.1/")) == "session=1"
+            # The body of a non-HTML response to an htmlOnly connection is skipped by resetting its stream, and the
+            #   connection is used for the next request.
+            conversation.converse(Connection(URL("127.0.0.1/file.bin"), "GET", "file", htmlOnly=True))
+            assert conversation.currConnection.response.isBodySkipped
+            conversation.converse(URL("127.0.0.1/after"))
+            assert conversation.currConnection.response.body == "<html>/after</html>"
+    finally:
+        server.close()
+    assert server.protocols == ["h2"]
+
+
+def test_converseManyHttp1Fallback(certificate):
+    server: LocalServer = LocalServer(*certificate, isHttp2=False)
+    try:
+        with newConversation(server, certificate[0]) as conversation:
+            conversation.converseMany([URL("127.0.0.1/"), URL("127.0.0.1/a"), URL("127.0.0.1/b")])
+            assert [connection.response.body for connection in conversation.connectionList] == \
+                   ["<html>/</html>", "<html>/a</html>", "<html>/b</html>"]
+            assert conversation.currConnection.response.httpVersion == "HTTP/1.1"
+    finally:
+        server.close()
+    assert server.protocols == ["http/1.1"]
+    assert server.paths == ["/", "/a", "/b"]
+
+
+def test_downloadOverHttp2Host(certificate, tmp_path):
+    server: LocalServer = LocalServer(*certificate)
+    try:
+        with newConversation(server, certificate[0]) as conversation:
+            conversation.converse(URL("127.0.0.1/"))
+            assert conversation.download("127.0.0.1/file.bin", tmp_path / "file.bin") == len(fileBody)
+            conversation.converse(URL("127.0.0.1/again"))
+    finally:
+        server.close()
+    # The download replaced the HTTP/2 connection with an HTTP/1.1 one, which converse then kept using.
+    assert server.protocols == ["h2", "http/1.1"]
+    assert server.paths == ["/", "/file.bin", "/again"]
+
+
+def test_sharedContextWithoutHttp2(certificate):
+    server: LocalServer = LocalServer(*certificate)
+    try:
+        with newConversation(server, certificate[0]) as conversation:
+            conversation.converse(URL("127.0.0.1/"))
+            with HttpConversation.HttpConversation(port=server.port, log=False, requestTimeOut=5,
+                                                   sslContext=conversation.sslContext) as http1Conversation:
+                http1Conversation.converse(URL("127.0.0.1/http1"))
+                assert http1Conversation.currConnection.response.httpVersion == "HTTP/1.1"
+                assert http1Conversation.currConnection.response.body == "<html>/http1</html>"
+    finally:
+        server.close()
+    assert server.protocols == ["h2", "http/1.1"]
@@ -0,0 +1,41 @@
+import pytest
+import httpHistory
+import httpUtils
+
+
+def newConnection(i: int) -> httpUtils.Connection:
+    connection = httpUtils.Connection(f"https://www.example.com/{i}", "GET", str(i))
+    connection.response = httpUtils.Response(connection.url)
+    connection.response.statusCode = "200"
+    connection.response.body = f"body {i} \xe9" * 100
+    return connection
+
+
+def test_historyPolicies():
+    for policy in httpHistory.historyPolicies:
+        history = httpHistory.ConnectionHistory(policy, 3)
+        for i in range(10):
+            history.append(newConnection(i))
+        assert len(history) == 10
+        assert [connection.name for connection in history[-3:]] == ["7", "8", "9"]
+        assert all(connection.response.body == f"body {i} \xe9" * 100 for i, connection in enumerate(history[7:], 7))
+        if policy == "last":
+            with pytest.raises(IndexError):
+                history[0]
+            assert [connection.name for connection in history] == ["7", "8", "9"]
+            assert len(history._ConnectionHistory__connections) == 3
+        else:
+            assert history[0].response.statusCode == "200"
+            expectedBody = "" if policy == "metadata" else "body 0 \xe9" * 100
+            assert history[0].response.body == expectedBody
+        history.close()
+
+
+def test_spillStore(tmp_path):
+    history = httpHistory.ConnectionHistory("spill", 1, str(tmp_path / "bodies.bin"))
+    for i in range(5):
+        history.append(newConnection(i))
+    assert isinstance(history[2].response._Response__body, httpHistory.SpilledBody)
+    assert history.store.size == sum(len(f"body {i} \xe9" * 100) for i in range(4))
+    assert [connection.response.body for connection in history] == [f"body {i} \xe9" * 100 for i in range(5)]
+    history.close()
@@ -0,0 +1,69 @@
+from xml.etree.ElementTree import parse
+from httpLinkGraph import LinkGraph
+from httpUtils import URL
+
+
+def buildGraph() -> LinkGraph:
+    # a -> b, a -> c, b -> c, c -> a, d -> b (d is fetched but nothing links to it).
+    graph: LinkGraph = LinkGraph()
+    a, b, c, d = (graph.addNode(URL(f"example.com/{name}")) for name in "abcd")
+    graph.addEdges(a, [b, c, b])
+    graph.addEdges(c, [a])
+    graph.addEdges(b, [c])
+    graph.addEdges(d, [b])
+    for nodeId in (a, b, c, d):
+        graph.setNodeInfo(nodeId, 200, 10 * nodeId)
+    return graph
+
+
+def test_addNode():
+    graph: LinkGraph = LinkGraph()
+    assert graph.addNode(URL("https://example.com/a"), 3) == 0
+    assert graph.addNode(URL("example.com/a#top"), 1) == 0
+    assert graph.addNode(URL("example.com/b")) == 1
+    assert len(graph) == 2 and graph.depth.tolist() == [1, -1] and graph.status.tolist() == [0, 0]
+
+
+def test_queries():
+    graph: LinkGraph = buildGraph()
+    assert graph.getEdgesNum() == 5
+    assert [graph.getLinks(nodeId).tolist() for nodeId in range(4)] == [[1, 2], [2], [0], [1]]
+    assert graph.getInDegrees().tolist() == [1, 2, 2, 0]
+    assert graph.getOrphans() == [3]
+    assert graph.getOrphans([3]) == []
+    assert graph.getClickDepths(0).tolist() == [0, 1, 1, -1]
+    assert graph.getClickDepths(3).tolist() == [3, 1, 2, 0]
+
+
+def test_binaryRoundTrip(tmp_path):
+    graph: LinkGraph = buildGraph()
+    graph.saveBinary(tmp_path / "graph.bin")
+    loaded: LinkGraph = LinkGraph.loadBinary(tmp_path / "graph.bin")
+    assert loaded.urls == graph.urls and loaded.size == graph.size and loaded.status == graph.status
+    assert loaded.getAdjacency() == graph.getAdjacency()
+    assert loaded.getNodeId(URL("example.com/c")) == 2
+    loaded.addEdges(loaded.addNode(URL("example.com/e")), [3])
+    assert loaded.getOrphans() == []
+
+
+def test_portsRoundTrip(tmp_path):
+    graph: LinkGraph = LinkGraph()
+    urls: list[URL] = [URL("http://localhost.test:8080/a?x=1"), URL("http://localhost.test:8081/a?x=1"),
+                       URL("http://localhost.test/a?x=1")]
+    assert [graph.addNode(url) for url in urls] == [0, 1, 2]
+    graph.saveBinary(tmp_path / "graph.bin")
+    loaded: LinkGraph = LinkGraph.loadBinary(tmp_path / "graph.bin")
+    assert [loaded.getNodeId(url) for url in urls] == [0, 1, 2]
+    assert len(set(loaded.urls)) == 3
+
+
+def test_export(tmp_path):
+    graph: LinkGraph = buildGraph()
+    graph.exportCsv(tmp_path / "nodes.csv", tmp_path / "edges.csv")
+    assert (tmp_path / "nodes.csv").read_text().splitlines()[2] == "1,example.com/b,200,-1,10"
+    assert len((tmp_path / "edges.csv").read_text().splitlines()) == 6
+    graph.exportGraphML(tmp_path / "graph.graphml")
+    root = parse(tmp_path / "graph.graphml").getroot()
+    namespace: str = "{http://graphml.graphdrawing.org/xmlns}"
+    assert len(root.findall(f"{namespace}graph/{namespace}node")) == 4
+    assert len(root.findall(f"{namespace}graph/{namespace}edge")) == 5
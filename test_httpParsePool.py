@@ -0,0 +1,29 @@
+import httpParsePool
+import httpUtils
+from gzip import compress
+
+testFilesLocation = "test_files/"
+
+
+def buildResponse() -> bytes:
+    with open(f"{testFilesLocation}test_orefPage.txt", "rb") as f:
+        body: bytes = compress(f.read())
+    return b"HTTP/1.1 200 OK\r\nContent-Encoding: gzip\r\nSet-Cookie: a=b; path=/\r\n" + \
+        f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+
+
+def test_parsePage():
+    referenceLinks = set(httpUtils.getLinksFromHTML(f"file://{testFilesLocation}test_orefPage.txt"))
+    parsedPage = httpParsePool.parsePage(buildResponse(), "https://www.oref.org.il/")
+    assert parsedPage.statusCode == "200"
+    assert parsedPage.headers["content-encoding"] == "gzip"
+    assert parsedPage.cookies == ["a=b; path=/"]
+    assert set(httpUtils.URL(link) for link in parsedPage.links) == referenceLinks
+
+
+def test_parsePool():
+    responseBytes = buildResponse()
+    url = httpUtils.URL("https://www.oref.org.il/")
+    with httpParsePool.ParsePool(2) as pool:
+        futures = [pool.submit(responseBytes, url) for _ in range(3)]
+        assert all(future.result() == httpParsePool.parsePage(responseBytes, url.urlStr) for future in futures)
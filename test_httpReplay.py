@@ -0,0 +1,82 @@
+import pytest
+import HttpConversation
+from httpLinkGraph import LinkGraph
+from httpReplay import CaptureArchive, getCanonicalUrl
+from httpUtils import URL, Request
+from conftest import LocalRequestHandler, runServer
+
+fileContent: bytes = bytes(range(256)) * 1000
+
+
+def test_getCanonicalUrl():
+    assert getCanonicalUrl(URL("https://Example.com/a?b=2&a=1#top")) == "example.com/a?a=1&b=2"
+    assert getCanonicalUrl(URL("example.com/a")) == getCanonicalUrl(URL("https://example.com/a"))
+
+
+def test_captureArchive(tmp_path):
+    path: str = str(tmp_path / "capture")
+    page: Request = Request("GET", URL("example.com/page"), False)
+    rangeRequest: Request = Request("GET", URL("example.com/file"), False, moreHeaders={"Range": "bytes=0-9"})
+    with CaptureArchive(path, isRecording=True) as archive:
+        archive.record(page, b"first", False, 0.5)
+        archive.record(page, b"second", False, 0.25)
+        archive.record(rangeRequest, b"range", True, 0.1)
+    with open(f"{path}.index", "a") as f:
+        f.write('{"key": "GET example.com/cut", "off')
+    with CaptureArchive(path) as archive:
+        assert archive.replay(page) == (b"first", False)
+        assert archive.replay(page) == (b"second", False)
+        assert archive.replay(page) == (b"second", False)
+        assert archive.replay(rangeRequest) == (b"range", True)
+        assert archive.replay(Request("GET", URL("example.com/file"), False)) is None
+        assert archive.records["GET example.com/page"][0].elapsed == 0.5
+    with pytest.raises(FileNotFoundError):
+        CaptureArchive(str(tmp_path / "missing"))
+
+
+class SiteRequestHandler(LocalRequestHandler):
+    requestedPaths: list[str] = []
+
+    def do_GET(self):
+        path: str = self.getRequestedPath()
+        self.requestedPaths.append(path)
+        if path == "/file.bin":
+            contentType, body = "application/octet-stream", fileContent
+        else:
+            contentType, body = "text/html", b'<html><a href="127.0.0.1/a"></a><a href="127.0.0.1/b"></a></html>'
+        self.sendBody(body, contentType)
+
+
+def crawl(port: int, archive: CaptureArchive, tmp_path) -> LinkGraph:
+    linkGraph: LinkGraph = LinkGraph()
+    with HttpConversation.HttpConversation(port=port, isSecure=False, log=False, captureArchive=archive) \
+            as conversation:
+        conversation.mapDomain("127.0.0.1/", 3, useRobots=False, linkGraph=linkGraph)
+        assert conversation.download("127.0.0.1/file.bin", str(tmp_path / "file.bin"), 4096) == len(fileContent)
+    return linkGraph
+
+
+def test_recordReplayConversation(tmp_path):
+    path: str = str(tmp_path / "capture")
+    with runServer(SiteRequestHandler) as port:
+        with CaptureArchive(path, isRecording=True) as archive:
+            recordedGraph: LinkGraph = crawl(port, archive, tmp_path)
+    assert SiteRequestHandler.requestedPaths == ["/", "/a", "/b", "/file.bin"]
+    (tmp_path / "file.bin").unlink()
+    # The server is gone, so everything comes from the archive.
+    with CaptureArchive(path) as archive:
+        replayedGraph: LinkGraph = crawl(port, archive, tmp_path)
+        with HttpConversation.HttpConversation(port=port, isSecure=False, log=False, captureArchive=archive) \
+                as conversation:
+            with pytest.raises(LookupError):
+                conversation.converse(URL("127.0.0.1/c"))
+    assert replayedGraph.urls == recordedGraph.urls
+    # The archive was recorded without robots.txt and sitemaps, a replayed crawl that asks for them goes on without.
+    with CaptureArchive(path) as archive:
+        with HttpConversation.HttpConversation(port=port, isSecure=False, log=False, captureArchive=archive) \
+                as conversation:
+            robotsGraph: LinkGraph = LinkGraph()
+            conversation.mapDomain("127.0.0.1/", 3, linkGraph=robotsGraph)
+    assert robotsGraph.urls == recordedGraph.urls
+    assert replayedGraph.getLinks(0).tolist() == recordedGraph.getLinks(0).tolist()
+    assert (tmp_path / "file.bin").read_bytes() == fileContent
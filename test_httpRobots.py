@@ -0,0 +1,70 @@
+import gzip
+import httpRobots
+import httpUtils
+
+robotsTxt = """# Comment
+User-agent: Googlebot
+Disallow: /
+
+User-agent: *
+User-agent: OtherBot
+Disallow: /private/
+Disallow: /*.pdf$
+Allow: /private/public
+Crawl-delay: 2.5
+
+Sitemap: https://www.example.com/sitemap_index.xml
+
+User-agent: m
+Disallow: /
+"""
+
+sitemapIndex = b"""<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <sitemap><loc>https://www.example.com/sitemap1.xml.gz</loc><lastmod>2022-08-01</lastmod></sitemap>
+</sitemapindex>"""
+
+sitemap = b"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>https://www.example.com/a.html</loc><lastmod>2022-08-01T10:00:00+00:00</lastmod></url>
+  <url><loc> https://www.example.com/b.html </loc></url>
+</urlset>"""
+
+imageSitemap = b"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"
+        xmlns:image="http://www.google.com/schemas/sitemap-image/1.1">
+  <url><loc>https://example.com/page</loc><image:image><image:loc>https://example.com/pic.jpg</image:loc></image:image>
+  </url>
+</urlset>"""
+
+
+def test_parseRobots():
+    rules = httpRobots.parseRobots(robotsTxt.splitlines())
+    assert rules.crawlDelay == 2.5
+    assert rules.sitemaps == ["https://www.example.com/sitemap_index.xml"]
+    assert rules.isAllowed(httpUtils.URL("https://www.example.com/index.html"))
+    assert rules.isAllowed(httpUtils.URL("https://www.example.com/private"))
+    assert not rules.isAllowed(httpUtils.URL("https://www.example.com/private/"))
+    assert not rules.isAllowed(httpUtils.URL("https://www.example.com/private/a.html"))
+    assert rules.isAllowed(httpUtils.URL("https://www.example.com/private/public/a.html"))
+    assert not rules.isAllowed(httpUtils.URL("https://www.example.com/files/a.pdf"))
+    assert rules.isAllowed(httpUtils.URL("https://www.example.com/files/a.pdf?download=1"))
+    googleRules = httpRobots.parseRobots(robotsTxt.splitlines(), "Googlebot")
+    assert not googleRules.isAllowed(httpUtils.URL("https://www.example.com/index.html"))
+    assert googleRules.crawlDelay is None
+    assert httpRobots.parseRobots(robotsTxt.splitlines(), "Googlebot/2.1").rules == googleRules.rules
+
+
+def test_iterSitemap(tmp_path):
+    (tmp_path / "index.xml").write_bytes(sitemapIndex)
+    (tmp_path / "sitemap.xml.gz").write_bytes(gzip.compress(sitemap))
+    assert list(httpRobots.iterSitemap(str(tmp_path / "index.xml"))) == [
+        httpRobots.SitemapEntry("https://www.example.com/sitemap1.xml.gz", "2022-08-01", True)]
+    assert list(httpRobots.iterSitemap(str(tmp_path / "sitemap.xml.gz"))) == [
+        httpRobots.SitemapEntry("https://www.example.com/a.html", "2022-08-01T10:00:00+00:00", False),
+        httpRobots.SitemapEntry("https://www.example.com/b.html", "", False)]
+    (tmp_path / "broken.xml").write_bytes(sitemap[:200])
+    assert len(list(httpRobots.iterSitemap(str(tmp_path / "broken.xml")))) <= 1
+    (tmp_path / "images.xml").write_bytes(imageSitemap)
+    assert list(httpRobots.iterSitemap(str(tmp_path / "images.xml"))) == [
+        httpRobots.SitemapEntry("https://example.com/page", "", False)]
@@ -0,0 +1,74 @@
+from math import inf
+import time
+import httpScheduler
+from httpScheduler import TokenBucket, HostScheduler, getRetryAfter
+from httpUtils import Response, URL
+
+
+class FakeClock:
+    def __init__(self):
+        self.now: float = 1000
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_tokenBucket():
+    bucket: TokenBucket = TokenBucket(2, 3)
+    now: float = bucket.lastUpdate
+    for _ in range(3):
+        assert bucket.getWaitTime(now) == 0
+        bucket.take(now)
+    assert bucket.getWaitTime(now) == 0.5
+    assert bucket.getWaitTime(now + 0.5) == 0
+    assert TokenBucket().getWaitTime(now) == 0
+
+
+def test_hostScheduler(monkeypatch):
+    clock: FakeClock = FakeClock()
+    monkeypatch.setattr(httpScheduler, "monotonic", clock)
+    scheduler: HostScheduler = HostScheduler(rate=1)
+    scheduler.setCrawlDelay("slow.com", 10)
+    for i in range(2):
+        scheduler.push("slow.com", f"slow{i}")
+        scheduler.push("fast.com", f"fast{i}")
+    assert len(scheduler) == 4
+    assert [scheduler.pop()[1] for _ in range(2)] == ["slow0", "fast0"]
+    assert scheduler.pop() is None and scheduler.getWaitTime() == 1
+    clock.now += 1
+    assert scheduler.pop() == ("fast.com", "fast1")
+    assert scheduler.pop() is None and scheduler.getWaitTime() == 9
+    clock.now += 9
+    assert scheduler.pop() == ("slow.com", "slow1")
+    assert not scheduler and scheduler.getWaitTime() == inf
+
+
+def test_hostSchedulerPenalty(monkeypatch):
+    clock: FakeClock = FakeClock()
+    monkeypatch.setattr(httpScheduler, "monotonic", clock)
+    scheduler: HostScheduler = HostScheduler(rate=4, basePenalty=2)
+    scheduler.push("a.com", "a0")
+    scheduler.push("a.com", "a1")
+    assert scheduler.penalize("a.com", 30) == 30
+    assert scheduler.hosts["a.com"].bucket.rate == 2
+    assert scheduler.getWaitTime() == 30
+    clock.now += 30
+    assert scheduler.pop() == ("a.com", "a0")
+    # Without Retry-After the penalty doubles with every penalty in a row.
+    assert scheduler.penalize("a.com") == 4
+    scheduler.reward("a.com")
+    assert scheduler.penalize("a.com") == 2
+    scheduler.reward("a.com")
+    # Every penalty halved the rate and every reward brought it up by a quarter.
+    assert scheduler.hosts["a.com"].bucket.rate == 4 / 2 / 2 * 1.25 / 2 * 1.25
+
+
+def test_getRetryAfter():
+    response: Response = Response(URL("example.com/"))
+    assert getRetryAfter(response) is None
+    response.headers["retry-after"] = "120"
+    assert getRetryAfter(response) == 120
+    response.headers["retry-after"] = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 60))
+    assert 55 < getRetryAfter(response) <= 60
+    response.headers["retry-after"] = "soon"
+    assert getRetryAfter(response) is None
@@ -1,3 +1,5 @@
+import gzip
+import pytest
 import httpUtils
 import re
 
@@ -137,3 +139,126 @@ def test_request():
     request["Sec-Fetch-Mode"] = "navigate"
     request["Sec-Fetch-Site"] = "none"
     assertions(request)
+
+
+def test_getBackoffDelay():
+    for attempt in range(1, 10):
+        for _ in range(20):
+            assert 0 <= httpUtils.getBackoffDelay(attempt, 0.5, 4) <= min(4, 0.5 * 2 ** (attempt - 1))
+
+
+def test_hostLatencyTracker():
+    tracker = httpUtils.HostLatencyTracker(windowSize=10, percentile=0.9, multiplier=2, minTimeOut=0.5, minSamples=3)
+    assert tracker.getTimeOut("www.example.com", 30) == 30
+    for latency in [0.1, 0.2, 0.3]:
+        tracker.record("www.example.com", latency)
+    assert tracker.getTimeOut("www.example.com", 30) == 0.6
+    assert tracker.getTimeOut("www.google.com", 30) == 30
+    for _ in range(10):
+        tracker.record("www.example.com", 100)
+    assert len(tracker.latencies["www.example.com"]) == 10
+    assert tracker.getTimeOut("www.example.com", 30) == 30
+    tracker.record("fast.example.com", 0.01)
+    tracker.record("fast.example.com", 0.01)
+    tracker.record("fast.example.com", 0.01)
+    assert tracker.getTimeOut("fast.example.com", 30) == 0.5
+
+
+def test_connectionIsIdempotent():
+    assert httpUtils.Connection("https://www.example.com/", "GET", "get").isIdempotent()
+    assert httpUtils.Connection("https://www.example.com/", "head", "head").isIdempotent()
+    assert not httpUtils.Connection("https://www.example.com/", "POST", "post").isIdempotent()
+
+
+def test_urlHash():
+    for path in referencePathDict:
+        assert {httpUtils.parsePath(path): path}[httpUtils.parsePath(path)] == path
+    for urlItem in referenceUrlDict:
+        url = httpUtils.URL(urlItem)
+        sameUrl = httpUtils.URL(url.fullUrlStr())
+        assert url == sameUrl and hash(url) == hash(sameUrl)
+    # Scheme and fragment aren't part of the equality, so they can't be part of the hash either.
+    assert hash(httpUtils.URL("http://www.google.com/index.html#a")) == hash(httpUtils.URL("https://www.google.com/index.html"))
+    assert httpUtils.URL("http://www.google.com/") != "http://www.google.com/"
+
+
+def test_isFileUrl():
+    assert httpUtils.isFileUrl(httpUtils.URL("https://www.example.com/files/lecture.PDF"))
+    assert httpUtils.isFileUrl(httpUtils.URL("https://www.example.com/image.webp?size=2"))
+    assert not httpUtils.isFileUrl(httpUtils.URL("https://www.example.com/webpage"))
+    assert not httpUtils.isFileUrl(httpUtils.URL("https://www.example.com/data.json"))
+    assert not httpUtils.isFileUrl(httpUtils.URL("https://www.example.com/"))
+
+
+def test_getUrlPattern():
+    assert httpUtils.getUrlPattern(httpUtils.URL("https://moodle.tau.ac.il/pluginfile.php/1234/a.pdf")) == \
+        "moodle.tau.ac.il/pluginfile.php/#/*.pdf"
+    assert httpUtils.getUrlPattern(httpUtils.URL("https://moodle.tau.ac.il/mod/page/view.php?id=12")) == \
+        "moodle.tau.ac.il/mod/page/*.php"
+    assert httpUtils.getUrlPattern(httpUtils.URL("https://moodle.tau.ac.il/")) == "moodle.tau.ac.il/*"
+
+
+def test_contentTypeMemo():
+    memo = httpUtils.ContentTypeMemo(minSamples=2)
+    pdfUrl = httpUtils.URL("https://www.example.com/files/1/a")
+    assert memo.getAction(pdfUrl) == "GET"
+    memo.record(httpUtils.URL("https://www.example.com/files/2/b"), "application/pdf")
+    assert memo.getAction(pdfUrl) == "GET"
+    memo.record(httpUtils.URL("https://www.example.com/files/3/c"), "application/pdf")
+    assert memo.getAction(pdfUrl) == "SKIP"
+    memo.record(httpUtils.URL("https://www.example.com/files/4/d"), "text/html; charset=utf-8")
+    assert memo.getAction(pdfUrl) == "HEAD"
+    # A couple of feeds among many pages don't make every page of the pattern cost a HEAD request.
+    rootUrl = httpUtils.URL("https://www.example.com/about")
+    memo.record(httpUtils.URL("https://www.example.com/feed"), "application/rss+xml")
+    memo.record(httpUtils.URL("https://www.example.com/status"), "application/json")
+    for i in range(10):
+        memo.record(httpUtils.URL(f"https://www.example.com/page{i}"), "text/html")
+    assert memo.getAction(rootUrl) == "GET"
+
+
+def test_getResponseBodyLength():
+    def buildResponse(head: str) -> httpUtils.Response:
+        return httpUtils.parseResponse(head.encode() + b"\r\n\r\n", httpUtils.URL("https://www.example.com/"), False)
+
+    assert httpUtils.getResponseBodyLength(buildResponse("HTTP/1.1 200 OK\r\nContent-Length: 1000"), "GET") == 1000
+    assert httpUtils.getResponseBodyLength(buildResponse("HTTP/1.1 200 OK\r\nContent-Length: 1000"), "HEAD") == 0
+    assert httpUtils.getResponseBodyLength(buildResponse("HTTP/1.1 304 Not Modified"), "GET") == 0
+    assert httpUtils.getResponseBodyLength(buildResponse("HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked"), "GET") == -1
+    assert httpUtils.getResponseBodyLength(buildResponse("HTTP/1.1 200 OK"), "GET") == -1
+
+
+def test_chunkedDecoder():
+    body = b"0123456789abcdef\r\n" * 100
+    chunkedBody = b"".join(f"{len(body[i:i + 70]):X};ext=1\r\n".encode() + body[i:i + 70] + b"\r\n"
+                           for i in range(0, len(body), 70)) + b"0\r\nTrailer: a\r\n\r\n"
+    assert httpUtils.decodeChunked(chunkedBody) == body
+    for packetSize in [1, 2, 3, 50, 1000]:
+        decoder = httpUtils.ChunkedDecoder()
+        decoded = b"".join(decoder.decode(chunkedBody[i:i + packetSize]) for i in range(0, len(chunkedBody), packetSize))
+        assert decoded == body and decoder.isDone
+    partialBody = httpUtils.decodeChunked(chunkedBody[:500])
+    assert partialBody and body.startswith(partialBody)
+
+
+def test_parseResponseInvalidBody():
+    body = gzip.compress(b"<html>" + b"x" * 1000 + b"</html>")
+    for encoding, content in [("gzip", body[:len(body) // 2]), ("gzip", b"not gzip"), ("deflate", b"not deflate"),
+                              ("br", b"not brotli")]:
+        with pytest.raises(ValueError):
+            httpUtils.parseResponse(f"HTTP/1.1 200 OK\r\nContent-Encoding: {encoding}\r\n\r\n".encode() + content,
+                                    httpUtils.URL("https://www.example.com/"))
+
+
+def test_parseContentRange():
+    assert httpUtils.parseContentRange("bytes 100-199/1000") == (100, 199, 1000)
+    assert httpUtils.parseContentRange("bytes */1000") == (-1, -1, 1000)
+    assert httpUtils.parseContentRange("bytes 100-199/*") == (100, 199, -1)
+
+
+def test_getUrlNameTruncation():
+    prefix: str = "example.com/" + "a" * 120
+    firstName: str = httpUtils.getUrlName(httpUtils.URL(prefix + "/first"))
+    secondName: str = httpUtils.getUrlName(httpUtils.URL(prefix + "/second"))
+    assert len(firstName) == len(secondName) == 60 and firstName != secondName
+    assert httpUtils.getUrlName(httpUtils.URL("example.com/a/b")) == "example.com_a_b"